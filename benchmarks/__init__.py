@@ -0,0 +1,6 @@
+'''Benchmarks of Ore.
+
+   - python3 -m benchmarks runs the suite over synthesized subclasses,
+     saves results as JSON and compares them against a baseline
+   - python3 -m benchmarks.bench_<name> runs one focused benchmark
+'''
@@ -0,0 +1,272 @@
+'''Run the benchmark suite on synthesized Ore subclasses.
+
+USAGE: python3 -m benchmarks [-c commands] [-f flags] [-p options] [-d doc lines]
+                             [-n repeat] [-k name ...] [-o results.json]
+                             [-b baseline.json] [-t threshold]
+
+Each benchmark is run repeat times, best run kept. Results are printed
+and, with -o, written as JSON. With -b, results are compared against a
+saved results file: exit status is 1 if any result is worse than the
+baseline by more than threshold (fraction, default 0.25).
+
+Runs headless: readline is stubbed and HOME is a temporary directory,
+so no history, docs cache or terminal of the user is touched.
+'''
+import os, sys, time, json, tempfile, platform
+from collections import OrderedDict
+
+from benchmarks import headless
+readline = headless.install()
+
+from oreio import redirect
+from flag import Flag, FlagSet, FlagError
+from benchmarks import synth
+
+
+FLAGS = FlagSet([Flag('c', 'Commands per subclass.', 'commands', type=int),
+                 Flag('f', 'Flags per command.', 'flags', type=int),
+                 Flag('p', 'Completion options per completer.', 'options', type=int),
+                 Flag('d', 'Docstring lines per command.', 'lines', type=int),
+                 Flag('n', 'Runs per benchmark (best kept).', 'repeat', type=int),
+                 Flag('k', 'Only run benchmarks starting with name.', 'name', repeat=True),
+                 Flag('o', 'Write results to file.', 'filename'),
+                 Flag('b', 'Compare with baseline results file.', 'filename'),
+                 Flag('t', 'Regression threshold.', 'fraction', type=float)])
+
+DEFAULTS = {"commands": 500, "flags": 4, "options": 10000, "doc_lines": 5, "repeat": 5}
+
+
+class Null(object):
+    '''Stand-in for the terminal, discards output.
+    '''
+
+    def write(self, s):
+        return len(s)
+
+    def flush(self):
+        return
+
+    def isatty(self):
+        return False
+
+
+def best(f, repeat):
+    '''Return smallest wall time of repeat calls of f.
+    '''
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def new_instance(cls):
+    argv = sys.argv
+    sys.argv = argv[:1]
+    try:
+        return cls()
+    finally:
+        sys.argv = argv
+
+
+## benchmarks: each returns a dict of {name: (value, unit, better)}
+## where better is "lower" or "higher"
+
+def bench_construction(config, repeat):
+    cls = [None]
+    def create():
+        cls[0] = synth.make_subclass(config["commands"], config["flags"], config["options"],
+                                     config["doc_lines"])
+
+    created = best(create, repeat)
+    constructed = best(lambda: new_instance(cls[0]), repeat)
+
+    return {"construction.class": (created * 1000, "ms", "lower"),
+            "construction.instance": (constructed * 1000, "ms", "lower")}
+
+
+def bench_evaluate(config, repeat):
+    ore = new_instance(synth.make_subclass(config["commands"], config["flags"]))
+    evaluate = ore._Ore__evaluate
+    lines = synth.make_lines(20000, config["commands"], config["flags"])
+
+    def run():
+        for line in lines:
+            evaluate(line)
+
+    with redirect(Null()):
+        elapsed = best(run, repeat)
+
+    return {"evaluate.throughput": (len(lines) / elapsed, "lines/s", "higher")}
+
+
+def bench_flags(config, repeat):
+    n = max(config["flags"], 1)
+    flagset = FlagSet(synth.make_flags(n))
+    flags = list(flagset)
+    lines = [synth.make_line(n, 50)] * 2000
+
+    compiled = best(lambda: [flagset.parse(l) for l in lines], repeat)
+    legacy = best(lambda: [Flag.parse_out_flags(l, flags) for l in lines], repeat)
+
+    return {"flags.flagset": (len(lines) / compiled, "lines/s", "higher"),
+            "flags.parse_out_flags": (len(lines) / legacy, "lines/s", "higher")}
+
+
+def bench_completion(config, repeat):
+    ore = new_instance(synth.make_subclass(config["commands"], 0, config["options"]))
+    completer = ore.completer
+    readline.set_completer(completer.complete)
+
+    texts = ["cmd{}".format(i) for i in range(1, 10)]
+    def commands():
+        for text in texts:
+            readline.set_buffer(text)
+            readline.press_tab()
+    names = best(commands, repeat) / len(texts)
+
+    # first Tab on a command runs its completer, later Tabs narrow
+    # its cached result
+    def cold():
+        completer.invalidate()
+        readline.set_buffer("cmd1 option")
+        readline.press_tab()
+    first = best(cold, repeat)
+
+    prefixes = ["cmd1 option{:03d}".format(i) for i in range(0, 1000, 37)]
+    def warm():
+        for line in prefixes:
+            readline.set_buffer(line)
+            readline.press_tab()
+    narrowed = best(warm, repeat) / len(prefixes)
+
+    return {"completion.commands": (names * 1000, "ms", "lower"),
+            "completion.first": (first * 1000, "ms", "lower"),
+            "completion.cached": (narrowed * 1000, "ms", "lower")}
+
+
+def bench_docs(config, repeat):
+    cls = synth.make_subclass(config["commands"], config["flags"], 0, config["doc_lines"])
+    ore = new_instance(cls)
+
+    def cold():
+        ore.docs_cache = False
+        ore._Ore__doc_cache = None
+        ore.compile_docs()
+    compiled = best(cold, repeat)
+
+    # rendered docs saved once, then loaded from disk
+    ore.docs_cache = True
+    ore._Ore__doc_cache = None
+    ore.compile_docs()
+    def warm():
+        ore._Ore__doc_cache = None
+        ore.compile_docs()
+    cached = best(warm, repeat)
+
+    return {"docs.compile": (compiled * 1000, "ms", "lower"),
+            "docs.cached": (cached * 1000, "ms", "lower")}
+
+
+def bench_capture(config, repeat):
+    class CaptureOre(synth.make_subclass(0)):
+        def ore_rows(self, args):
+            for i in range(int(args[0])):
+                print("row {} of generated output".format(i))
+
+        def ore_direct(self, args):
+            '''BYPASS'''
+            for i in range(int(args[0])):
+                print("row {} of generated output".format(i))
+
+    ore = new_instance(CaptureOre)
+    evaluate = ore._Ore__evaluate
+    rows = 20000
+
+    with redirect(Null()):
+        captured = best(lambda: evaluate("rows {}".format(rows)), repeat)
+        direct = best(lambda: evaluate("direct {}".format(rows)), repeat)
+
+    return {"capture.throughput": (rows / captured, "lines/s", "higher"),
+            "capture.overhead": ((captured - direct) / rows * 1e6, "us/line", "lower")}
+
+
+BENCHMARKS = OrderedDict([("construction", bench_construction), ("evaluate", bench_evaluate),
+                          ("flags", bench_flags), ("completion", bench_completion),
+                          ("docs", bench_docs), ("capture", bench_capture)])
+
+
+def compare(results, baseline, threshold):
+    '''Print change of each result against baseline, return names of
+    results worse by more than threshold.
+    '''
+    regressions = []
+    print("\n{:<24}{:>14}{:>14}{:>10}".format("vs baseline", "baseline", "now", "change"))
+    for name, result in results["results"].items():
+        old = baseline["results"].get(name)
+        if (not old or not old["value"]):
+            continue
+
+        change = (result["value"] - old["value"]) / abs(old["value"])
+        worse = change if result["better"] == "lower" else -change
+        flag = ""
+        if (worse > threshold):
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print("{:<24}{:>14.3f}{:>14.3f}{:>+9.0%}{}".format(name, old["value"], result["value"],
+                                                           change, flag))
+
+    if (baseline.get("config") != results["config"]):
+        print("WARNING: baseline was run with a different configuration.")
+
+    return regressions
+
+
+def main():
+    try:
+        flags, leftover = FLAGS.parse_tokens(sys.argv[1:])
+    except FlagError as e:
+        print("Error: {}".format(e))
+        sys.exit(2)
+
+    config = dict(DEFAULTS)
+    for name, key in (('c', "commands"), ('f', "flags"), ('p', "options"), ('d', "doc_lines"),
+                      ('n', "repeat")):
+        if (flags.get(name) is not None):
+            config[key] = flags[name]
+    only = flags.get('k') or []
+
+    # keep history and docs cache of the benchmark apart from the user's
+    os.environ["HOME"] = tempfile.mkdtemp(prefix="ore-bench-")
+
+    results = OrderedDict()
+    for name, bench in BENCHMARKS.items():
+        if (only and not any(name.startswith(k) or k.startswith(name) for k in only)):
+            continue
+        for metric, (value, unit, better) in bench(config, config["repeat"]).items():
+            if (only and not any(metric.startswith(k) for k in only)):
+                continue
+            results[metric] = {"value": value, "unit": unit, "better": better}
+            print("{:<24}{:>14.3f} {}".format(metric, value, unit))
+
+    report = {"config": config, "python": platform.python_version(),
+              "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+
+    if (flags.get('o')):
+        with open(flags['o'], 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if (flags.get('b')):
+        with open(flags['b']) as f:
+            baseline = json.load(f)
+        threshold = flags.get('t') if flags.get('t') is not None else 0.25
+        regressions = compare(report, baseline, threshold)
+        if (regressions):
+            print("{} regressions over {:.0%}: {}".format(len(regressions), threshold,
+                                                          ', '.join(regressions)))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
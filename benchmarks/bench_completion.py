@@ -0,0 +1,73 @@
+'''Measure Tab-completion latency with many options, for command names
+and for options returned by a subcompleter.
+
+USAGE: python3 -m benchmarks.bench_completion [options] [presses]
+'''
+import sys, time
+
+from benchmarks import headless
+from orecompleter import OreCompleter
+
+
+def press(completer, text):
+    '''Simulate one Tab press: collect every match for text.
+    '''
+    matches = []
+    state = 0
+    while (True):
+        m = completer.complete(text, state)
+        if (m is None): break
+        matches.append(m)
+        state += 1
+    return matches
+
+
+def run(label, completer, texts):
+    start = time.perf_counter()
+    for text in texts:
+        press(completer, text)
+    elapsed = time.perf_counter() - start
+    print("{:<24} {:>9.3f} ms per Tab".format(label, elapsed / len(texts) * 1000))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    presses = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    names = ["host{:06d}.example".format(i) for i in range(n)]
+    texts = ["host{:04d}".format(i * 7 % (n // 100)) for i in range(presses)]
+
+    print("{} options".format(n))
+
+    # command names
+    completer = OreCompleter(names)
+    run("command names", completer, texts)
+
+    # subcompleter options, line buffer set on the readline stub
+    calls = [0]
+    def completer_connect(text, line, begidx, endidx):
+        calls[0] += 1
+        return names
+
+    completer = OreCompleter(["connect"])
+    completer.set_command_completer("connect", completer_connect)
+
+    readline = headless.install()
+
+    # first Tab on "connect host" runs the subcompleter, later Tabs
+    # on longer text are narrowed from its cached result
+    start = time.perf_counter()
+    readline.set_buffer("connect host")
+    press(completer, "host")
+    print("{:<24} {:>9.3f} ms".format("first subcompleter Tab", (time.perf_counter() - start) * 1000))
+
+    start = time.perf_counter()
+    for text in texts:
+        readline.set_buffer("connect " + text)
+        press(completer, text)
+    elapsed = time.perf_counter() - start
+    print("{:<24} {:>9.3f} ms per Tab ({} subcompleter calls)".format(
+        "subcompleter options", elapsed / len(texts) * 1000, calls[0]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+'''Measure per-line command dispatch throughput.
+
+USAGE: python3 -m benchmarks.bench_dispatch [commands] [lines]
+'''
+import sys, time
+from io import StringIO
+
+from benchmarks.synth import make_subclass
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+
+    argv = sys.argv
+    sys.argv = argv[:1]
+    ore = make_subclass(n, flags=0)()
+    sys.argv = argv
+
+    evaluate = ore._Ore__evaluate
+    commands = ["cmd{} a b c".format(i % n) for i in range(lines)]
+
+    bu = sys.stdout
+    sys.stdout = StringIO()
+    start = time.perf_counter()
+    for line in commands:
+        evaluate(line)
+    elapsed = time.perf_counter() - start
+    sys.stdout = bu
+
+    print("{} commands registered, {} lines: {:.0f} commands/s".format(n, lines, lines / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+'''Measure flag parsing throughput for commands with many flags and
+long argument lines.
+
+USAGE: python3 -m benchmarks.bench_flags [flags] [tokens] [lines]
+'''
+import sys, time
+
+from flag import Flag
+from benchmarks.synth import make_flags, make_line
+
+try:
+    from flag import FlagSet
+except ImportError:
+    FlagSet = None
+
+
+def run(label, parse, lines):
+    start = time.perf_counter()
+    for line in lines:
+        parse(line)
+    elapsed = time.perf_counter() - start
+    print("{:<28} {:>10.0f} lines/s".format(label, len(lines) / elapsed))
+
+
+def main():
+    n_flags = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    n_tokens = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    n_lines = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+
+    flags = make_flags(n_flags)
+    lines = [make_line(n_flags, n_tokens)] * n_lines
+
+    print("{} flags, {} tokens per line".format(n_flags, n_tokens))
+    run("Flag.parse_out_flags", lambda l: Flag.parse_out_flags(l, flags), lines)
+
+    if (FlagSet):
+        flagset = FlagSet(flags)
+        run("FlagSet.parse (compiled)", flagset.parse, lines)
+
+
+if __name__ == "__main__":
+    main()
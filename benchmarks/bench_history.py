@@ -0,0 +1,63 @@
+'''Measure history index build, load and search latency over a large
+history file.
+
+USAGE: python3 -m benchmarks.bench_history [entries] [directory]
+'''
+import sys, os, time, random, tempfile
+
+from orehistory import HistoryIndex
+
+
+VERBS = ["status", "deploy", "restart", "logs", "connect", "show", "describe", "scale", "drain"]
+TARGETS = ["web", "db", "cache", "queue", "worker", "api", "auth", "search"]
+
+
+def make_history(path, n):
+    '''Write n plausible history entries to path.
+    '''
+    rnd = random.Random(1)
+    with open(path, 'w') as f:
+        for i in range(n):
+            f.write("{} {}{:03d}.{} -n {}\n".format(rnd.choice(VERBS), rnd.choice(TARGETS),
+                                                  rnd.randrange(1000), rnd.choice(["eu", "us", "ap"]),
+                                                  rnd.randrange(50)))
+
+
+def timed(label, f, repeat=1):
+    start = time.perf_counter()
+    for i in range(repeat):
+        result = f()
+    print("{:<34} {:>10.2f} ms".format(label, (time.perf_counter() - start) / repeat * 1000))
+    return result
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    directory = sys.argv[2] if len(sys.argv) > 2 else tempfile.mkdtemp()
+
+    path = os.path.join(directory, "bench_history")
+    make_history(path, n)
+
+    index = HistoryIndex(path)
+    timed("build index ({} entries)".format(n), index.update)
+    print("{} unique commands".format(len(index.commands)))
+    timed("save index", index.save)
+
+    index = HistoryIndex(path)
+    timed("load index", index.load)
+
+    for mode, query in [("substring", "restart db42"), ("substring", "worker"), ("prefix", "scale ap"),
+                        ("prefix", "lo"), ("fuzzy", "dplw12u"), ("fuzzy", "cnq")]:
+        results = timed("{} '{}'".format(mode, query), lambda: index.search(query, mode), repeat=5)
+        print("    {}".format(results[:2]))
+
+    with open(path, 'a') as f:
+        f.write("deploy web999.eu -n 1\n")
+    timed("incremental update (1 entry)", index.update)
+
+    for f in (path, path + '.idx'):
+        os.remove(f)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+'''Measure per-command overhead of isolated commands (run in a worker
+process of the pool) against in-process commands and against starting
+a fresh interpreter per command.
+
+USAGE: python3 -m benchmarks.bench_isolate [runs]
+'''
+import sys, time, subprocess
+
+from benchmarks import headless
+headless.install()
+
+from ore import Ore
+from oreio import redirect
+from orepool import isolated
+
+
+class IsolateOre(Ore):
+    def ore_local(self, args):
+        print(' '.join(args))
+
+    @isolated()
+    def ore_worker(self, args):
+        print(' '.join(args))
+
+    @isolated()
+    def ore_rows(self, args):
+        for i in range(int(args[0])):
+            print("row {} of generated output".format(i))
+
+
+class Null(object):
+    def write(self, s):
+        return len(s)
+
+    def flush(self):
+        return
+
+    def isatty(self):
+        return False
+
+
+def per_call(f, runs):
+    start = time.perf_counter()
+    for i in range(runs):
+        f()
+    return (time.perf_counter() - start) / runs
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    argv, sys.argv = sys.argv, sys.argv[:1]
+    ore = IsolateOre()
+    sys.argv = argv
+    evaluate = ore._Ore__evaluate
+
+    with redirect(Null()):
+        evaluate("worker warm up")
+        local = per_call(lambda: evaluate("local a b c"), runs)
+        worker = per_call(lambda: evaluate("worker a b c"), runs)
+        start = time.perf_counter()
+        evaluate("rows 200000")
+        rows = 200000 / (time.perf_counter() - start)
+
+    spawn = per_call(lambda: subprocess.run([sys.executable, "-c", "print('a b c')"],
+                                            stdout=subprocess.DEVNULL), 20)
+
+    print("in process:        {:8.3f} ms/command".format(local * 1000))
+    print("isolated (pool):   {:8.3f} ms/command".format(worker * 1000))
+    print("fresh interpreter: {:8.3f} ms/command".format(spawn * 1000))
+    print("isolated output:   {:8.0f} lines/s".format(rows))
+    ore._Ore__get_pool().close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+'''Measure cold start of an Ore app with many heavy plugin commands,
+imported eagerly (ore_* methods of the subclass) against lazily
+(declared in a manifest, imported on first use).
+
+USAGE: python3 -m benchmarks.bench_plugins [plugins] [functions per plugin] [runs]
+
+Each start runs in a fresh interpreter: time from importing the app
+module to a constructed instance, ready for the first prompt. A
+plugin module defines many functions and builds a table on import,
+standing in for the dependencies real plugins pull in.
+'''
+import os, sys, json, subprocess, tempfile
+
+
+PLUGIN = '''
+TABLE = {{i: str(i) * 4 for i in range({table})}}
+
+def ore_cmd{n}(self, args, flags):
+    """Command of plugin {n}."""
+    print(len(TABLE), args)
+{functions}
+'''
+
+FUNCTION = '''
+def helper{i}(x, y={i}):
+    if (x > y):
+        return [x * k for k in range(y % 7)]
+    return {{"x": x, "y": y, "s": str(x) + str(y)}}
+'''
+
+EAGER = '''
+from ore import Ore
+{imports}
+
+class App(Ore):
+{methods}
+'''
+
+LAZY = '''
+from ore import Ore
+
+class App(Ore):
+    plugins = [{manifest!r}]
+'''
+
+START = '''
+import sys, time
+start = time.perf_counter()
+import {module}
+app = {module}.App()
+ready = time.perf_counter()
+app.execute("cmd0 a")
+print(ready - start, time.perf_counter() - ready, len(sys.modules))
+'''
+
+
+def write_plugins(path, plugins, functions):
+    functions = ''.join(FUNCTION.format(i=i) for i in range(functions))
+    for n in range(plugins):
+        with open(os.path.join(path, "plugin{}.py".format(n)), 'w') as f:
+            f.write(PLUGIN.format(n=n, table=20000, functions=functions))
+
+    with open(os.path.join(path, "app_eager.py"), 'w') as f:
+        f.write(EAGER.format(imports='\n'.join("import plugin{}".format(n) for n in range(plugins)),
+                             methods='\n'.join("    ore_cmd{0} = plugin{0}.ore_cmd{0}".format(n)
+                                               for n in range(plugins))))
+
+    manifest = os.path.join(path, "manifest.json")
+    with open(manifest, 'w') as f:
+        commands = lambda n: {"cmd{}".format(n): {"doc": "Command of plugin {}.".format(n),
+                                                  "usage": "cmd{} [args]".format(n)}}
+        json.dump({"plugins": [{"module": "plugin{}".format(n), "group": "Plugins",
+                                "commands": commands(n)} for n in range(plugins)]}, f)
+
+    with open(os.path.join(path, "app_lazy.py"), 'w') as f:
+        f.write(LAZY.format(manifest=manifest))
+
+
+def start(path, module):
+    '''Start app in a fresh interpreter, return (seconds to ready,
+    seconds of first command, modules loaded).
+    '''
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, HOME=path, PYTHONPATH=os.pathsep.join([path, root]))
+    # starts after the first load compiled modules from .pyc files
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    out = subprocess.run([sys.executable, "-c", START.format(module=module)], env=env, cwd=path,
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                         universal_newlines=True, check=True).stdout
+    ready, first, modules = out.split()[-3:]
+    return (float(ready), float(first), int(modules))
+
+
+def main():
+    plugins = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    functions = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    runs = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    with tempfile.TemporaryDirectory(prefix="ore-plugins-") as path:
+        write_plugins(path, plugins, functions)
+
+        for module in ("app_eager", "app_lazy"):
+            # first start compiles the modules, later ones use .pyc files
+            start(path, module)
+            results = [start(path, module) for i in range(runs)]
+            ready = min(r[0] for r in results)
+            first = min(r[1] for r in results)
+            print("{:<10} {} plugins: ready in {:.1f} ms, first command {:.1f} ms, {} modules".format(
+                  module[4:], plugins, ready * 1000, first * 1000, results[0][2]))
+
+
+if __name__ == "__main__":
+    main()
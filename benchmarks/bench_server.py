@@ -0,0 +1,82 @@
+'''Load test server mode with many simultaneous local clients.
+
+USAGE: python3 -m benchmarks.bench_server [clients] [lines per client]
+'''
+import sys, time, threading, tempfile, os
+from io import StringIO
+
+from ore import Ore
+from oreserver import OreServer, OreClient
+
+
+class BenchOre(Ore):
+
+    def ore_echo(self, args):
+        '''Print arguments.'''
+        print(' '.join(args))
+
+    def ore_rows(self, args):
+        '''Print a number of rows.'''
+        for i in range(int(args[0])):
+            print("row {}".format(i))
+
+    def completer_echo(self, text, line, begidx, endidx):
+        return ["alpha", "beta", "gamma"]
+
+
+def run_client(path, lines, latencies, errors):
+    client = OreClient(path)
+    out = StringIO()
+    for i in range(lines):
+        start = time.perf_counter()
+        if (i % 10 == 9):
+            client.complete_line("a", "echo a", 5, 6)
+        else:
+            running, error = client.execute("echo {}".format(i) if i % 2 else "rows 20", out)
+            if (error): errors.append(error)
+        latencies.append(time.perf_counter() - start)
+    client.execute("quit", out)
+    client.close()
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    argv = sys.argv
+    sys.argv = argv[:1]
+    ore = BenchOre()
+    sys.argv = argv
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.sock")
+    server = OreServer(ore, path)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    latencies = []
+    errors = []
+    threads = [threading.Thread(target=run_client, args=(path, lines, latencies, errors))
+               for i in range(clients)]
+
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    server.shutdown()
+    server.server_close()
+
+    latencies.sort()
+    print("{} clients x {} requests: {:.0f} requests/s, {} errors".format(
+        clients, lines, len(latencies) / elapsed, len(errors)))
+    print("latency ms: p50 {:.2f}  p95 {:.2f}  p99 {:.2f}  max {:.2f}".format(
+        *(1000 * percentile(latencies, p) for p in (50, 95, 99, 100))))
+
+
+if __name__ == "__main__":
+    main()
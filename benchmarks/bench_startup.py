@@ -0,0 +1,30 @@
+'''Measure class creation ("import") time and construction time of a
+large Ore subclass.
+
+USAGE: python3 -m benchmarks.bench_startup [commands] [instances]
+'''
+import sys, time
+
+from benchmarks.synth import make_subclass
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    instances = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    sys.argv = sys.argv[:1]
+
+    start = time.perf_counter()
+    cls = make_subclass(n, flags=2, options=2)
+    created = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(instances):
+        cls()
+    constructed = (time.perf_counter() - start) / instances
+
+    print("{} commands: class creation {:.2f} ms, construction {:.2f} ms".format(
+        n, created * 1000, constructed * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+'''Compare time-to-first-line and peak memory of the buffered capture
+path (print inside ore_*) against a streaming (generator) ore_* command.
+
+USAGE: python3 -m benchmarks.bench_streaming [lines]
+'''
+import sys, time, tracemalloc
+
+from ore import Ore
+
+
+class Console(object):
+    '''Stand-in for the terminal: discards output, records time of
+    first write.
+    '''
+
+    def __init__(self):
+        self.first = None
+
+    def write(self, s):
+        if (self.first is None):
+            self.first = time.perf_counter()
+        return len(s)
+
+    def flush(self):
+        return
+
+
+class BenchOre(Ore):
+
+    def ore_printed(self, args):
+        for i in range(int(args[0])):
+            print("row {} of generated output".format(i))
+
+    def ore_streamed(self, args):
+        for i in range(int(args[0])):
+            yield "row {} of generated output".format(i)
+
+
+def run(ore, line):
+    evaluate = ore._Ore__evaluate
+    console = Console()
+
+    bu = sys.stdout
+    sys.stdout = console
+    start = time.perf_counter()
+    evaluate(line)
+    elapsed = time.perf_counter() - start
+
+    # second run for peak memory, tracemalloc slows allocation down
+    tracemalloc.start()
+    evaluate(line)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    sys.stdout = bu
+
+    print("{:<20} first line {:>9.2f} ms   total {:>8.2f} s   peak {:>9.1f} KiB".format(
+        line.split()[0], (console.first - start) * 1000, elapsed, peak / 1024))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    argv = sys.argv
+    sys.argv = argv[:1]
+    ore = BenchOre()
+    sys.argv = argv
+
+    print("{} lines".format(n))
+    run(ore, "printed {}".format(n))
+    run(ore, "streamed {}".format(n))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+'''Measure "did you mean" suggestion lookups for misspelled commands,
+with the deletion index of an Ore subclass against a linear scan of
+edit distances.
+
+USAGE: python3 -m benchmarks.bench_suggest [commands] [lookups]
+'''
+import sys, time, random
+
+from orecompleter import SuggestionIndex, edit_distance
+
+
+def make_names(n):
+    '''Command names of two to three words, as apps name them.
+    '''
+    random.seed(7)
+    words = ["status", "start", "stop", "restart", "list", "show", "config", "user", "group",
+             "network", "disk", "service", "log", "cache", "backup", "restore", "sync", "deploy"]
+    names = set()
+    while (len(names) < n):
+        names.add('_'.join(random.sample(words, random.randint(2, 3))) + str(random.randint(0, 99)))
+    return sorted(names)
+
+
+def misspell(name):
+    i = random.randrange(len(name) - 1)
+    edit = random.randrange(3)
+    if (edit == 0):
+        return name[:i] + name[i+1:]
+    if (edit == 1):
+        return name[:i] + name[i+1] + name[i] + name[i+2:]
+    return name[:i] + 'x' + name[i+1:]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    names = make_names(n)
+    queries = [misspell(random.choice(names)) for i in range(lookups)]
+
+    start = time.perf_counter()
+    index = SuggestionIndex(names)
+    created = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index.suggest(queries[0])
+    built = time.perf_counter() - start
+
+    times = []
+    for q in queries[1:]:
+        start = time.perf_counter()
+        index.suggest(q)
+        times.append(time.perf_counter() - start)
+    times.sort()
+
+    start = time.perf_counter()
+    for q in queries[:100]:
+        sorted((edit_distance(q, name, 2), name) for name in names)
+    scan = (time.perf_counter() - start) / 100
+
+    print("{} commands: index created in {:.3f} ms, built on first lookup in {:.0f} ms".format(
+          n, created * 1000, built * 1000))
+    print("lookup: mean {:.3f} ms, p99 {:.3f} ms, max {:.3f} ms".format(
+          sum(times) / len(times) * 1000, times[int(len(times) * 0.99)] * 1000, times[-1] * 1000))
+    print("linear scan: {:.3f} ms".format(scan * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+'''Measure TableRenderer throughput and peak memory for many rows.
+
+USAGE: python3 -m benchmarks.bench_table [rows]
+'''
+import sys, time, tracemalloc
+
+from textstyler import TableRenderer, Styler
+
+
+class Terminal(object):
+    '''Stand-in for a terminal, discards output.
+    '''
+
+    def write(self, s):
+        return len(s)
+
+    def isatty(self):
+        return True
+
+
+def rows(n):
+    return ((i, i * i, "row {}".format(i), "日本" if i % 7 == 0 else "") for i in range(n))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    table = TableRenderer(["n", "square", "name", "note"], styles=[None, Styler.GREEN])
+
+    for styled in (True, False):
+        table.styled = styled
+        start = time.perf_counter()
+        table.render(rows(n), Terminal())
+        elapsed = time.perf_counter() - start
+        print("{} rows, styled={}: {:.0f} rows/s".format(n, styled, n / elapsed))
+
+    # peak memory measured on a tenth of the rows (tracing is slow)
+    tracemalloc.start()
+    table.render(rows(n // 10), Terminal())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print("{} rows: peak {:.0f} KB".format(n // 10, peak / 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+'''Measure characters written by FrameRenderer redrawing frames of a
+status listing where a few lines change per frame, against reprinting
+every frame whole.
+
+USAGE: python3 -m benchmarks.bench_watch [lines] [frames] [changed lines]
+'''
+import sys, time
+from unittest import mock
+
+from textstyler import FrameRenderer, Cursor
+
+
+class Terminal(object):
+    '''Stand-in for a terminal, counts characters written.
+    '''
+
+    def __init__(self):
+        self.written = 0
+
+    def write(self, s):
+        self.written += len(s)
+        return len(s)
+
+    def flush(self):
+        return
+
+    def isatty(self):
+        return True
+
+
+def frames(lines, count, changed):
+    '''Yield count frames of lines, changed lines differing per frame
+    and every other frame repeating the previous one.
+    '''
+    step = lines // changed or 1
+    for f in range(count):
+        t = f // 2
+        yield ["Every 2s: status", ""] + ["svc{:<6} {}".format(i, t if i % step == 0 else "up")
+                                          for i in range(lines)]
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    changed = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    # a terminal tall and wide enough for the whole frame
+    size = mock.Mock(columns=200, lines=lines + 10)
+    with mock.patch("shutil.get_terminal_size", return_value=size):
+        terminal = Terminal()
+        renderer = FrameRenderer(terminal)
+        start = time.perf_counter()
+        for frame in frames(lines, count, changed):
+            renderer.draw(frame)
+        elapsed = time.perf_counter() - start
+
+    reprinted = Terminal()
+    for frame in frames(lines, count, changed):
+        reprinted.write(Cursor.CLEAR_SCREEN + ''.join(line + '\n' for line in frame))
+
+    print("{} frames of {} lines, {} changing: {:.0f} frames/s, {} skipped".format(
+          count, lines, changed, count / elapsed, renderer.skipped))
+    print("written: {:.1f} MB redrawn vs {:.1f} MB reprinted ({:.1%})".format(
+          terminal.written / 1e6, reprinted.written / 1e6, terminal.written / reprinted.written))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+'''Stand-in for the readline module, so benchmarks run without a
+terminal and never touch the real readline history.
+
+    from benchmarks import headless
+    readline = headless.install()
+    readline.set_buffer("connect ho")
+
+install() before or after importing ore; modules that already
+imported readline are switched to the stub.
+'''
+import sys, types
+
+
+class StubReadline(types.ModuleType):
+    '''readline functions used by Ore, with a settable line buffer.
+    '''
+
+    def __init__(self):
+        super().__init__("readline")
+        self.history = []
+        self.completer = None
+        self.line = ""
+        self.begidx = 0
+        self.endidx = 0
+
+    def set_buffer(self, line, begidx=None, endidx=None):
+        '''Set line being completed, text defaults to its last word.
+        '''
+        self.line = line
+        self.begidx = line.rfind(' ') + 1 if begidx is None else begidx
+        self.endidx = len(line) if endidx is None else endidx
+
+    def press_tab(self):
+        '''Collect every match the completer gives for the buffer.
+        '''
+        text = self.line[self.begidx:self.endidx]
+        matches = []
+        while (True):
+            m = self.completer(text, len(matches))
+            if (m is None): return matches
+            matches.append(m)
+
+    def get_line_buffer(self):
+        return self.line
+
+    def get_begidx(self):
+        return self.begidx
+
+    def get_endidx(self):
+        return self.endidx
+
+    def set_completer(self, completer=None):
+        self.completer = completer
+
+    def parse_and_bind(self, string):
+        return
+
+    def add_history(self, line):
+        self.history.append(line)
+
+    def get_current_history_length(self):
+        return len(self.history)
+
+    def get_history_item(self, index):
+        return self.history[index-1] if 0 < index <= len(self.history) else None
+
+    def remove_history_item(self, pos):
+        del self.history[pos]
+
+
+def install():
+    '''Install the stub as readline, return it.
+    '''
+    stub = sys.modules.get("readline")
+    if (not isinstance(stub, StubReadline)):
+        stub = StubReadline()
+        sys.modules["readline"] = stub
+
+    for name in ("ore", "orecompleter", "oreserver"):
+        module = sys.modules.get(name)
+        if (module):
+            module.readline = stub
+
+    return stub
@@ -0,0 +1,84 @@
+'''Synthesized Ore subclasses, flags and input lines for benchmarks.
+'''
+from ore import Ore
+from flag import Flag
+
+
+def make_flags(n):
+    '''Build n flags, every other one taking an argument.
+    '''
+    return [Flag("f{}".format(i), "generated flag", "value" if i % 2 else "") for i in range(n)]
+
+
+def make_line(n_flags, n_tokens):
+    '''Build an argument line of n_tokens with a flag every tenth token.
+    '''
+    tokens = []
+    for i in range(n_tokens):
+        if (i % 10 == 0):
+            f = (i // 10) % n_flags
+            tokens.append("-f{}".format(f))
+            if (f % 2): tokens.append("v{}".format(i))
+        else:
+            tokens.append("arg{}".format(i))
+    return ' '.join(tokens)
+
+
+def make_docstring(lines):
+    '''Build a command docstring of about lines lines, with usage and
+    example.
+    '''
+    doc = ["Generated command."]
+    doc += ["Line {} of a long description of what the command does.".format(i)
+            for i in range(max(lines - 3, 0))]
+    doc += ["USAGE: cmd [flags] [args]", "EXAMPLE: cmd a b"]
+    return '\n        '.join(doc) + '\n        '
+
+
+def make_subclass(commands=100, flags=2, options=0, doc_lines=3, name="SynthOre"):
+    '''Build an Ore subclass.
+
+       - commands: number of ore_cmd<i> commands, each printing its
+         args
+       - flags: flags per command (flags_cmd<i>), every other one
+         taking an argument
+       - options: if not 0, every command gets a completer returning
+         this many options
+       - doc_lines: docstring length of each command
+    '''
+    doc = make_docstring(doc_lines)
+    command_flags = make_flags(flags)
+    completions = ["option{:06d}".format(i) for i in range(options)]
+
+    attrs = {"__doc__": "Synthesized app.\nUSAGE: app [options]\n"}
+    for i in range(commands):
+        def command(self, args, flags):
+            print(' '.join(args))
+        command.__doc__ = doc
+
+        attrs["ore_cmd{}".format(i)] = command
+        if (command_flags):
+            attrs["flags_cmd{}".format(i)] = command_flags
+
+        if (options):
+            def completer(self, text, line, begidx, endidx):
+                return completions
+            attrs["completer_cmd{}".format(i)] = completer
+
+    return type(name, (Ore,), attrs)
+
+
+def make_lines(n, commands, flags, args=3):
+    '''Build n input lines over commands of make_subclass, using every
+    flag in turn.
+    '''
+    lines = []
+    for i in range(n):
+        words = ["cmd{}".format(i % commands)]
+        if (flags):
+            f = i % flags
+            words.append("-f{}".format(f))
+            if (f % 2): words.append("v")
+        words += ["a{}".format(j) for j in range(args)]
+        lines.append(' '.join(words))
+    return lines
@@ -1,45 +1,69 @@
-import re
+class FlagError(Exception):
+    '''Raised when a flag argument fails type conversion or validation.
+    '''
+
 
 class Flag(object):
     '''Flag class to be used with Ore command line interpreter.
 
        - stores flag information (name, description, argument, function)
+       - optionally converts/validates its argument (type, choices)
+       - optionally may be repeated on a line (values collected in a list)
        - parses out flag call from input line
        - static class to parse out all flags from an input line
     '''
 
-    def __init__(self, name, description, arg="", f=None):
+    def __init__(self, name, description, arg="", f=None, type=None, choices=None, repeat=False):
         self.name = name
         self.description = description
         self.arg = arg
         self.f = f
+        self.type = type
+        self.choices = choices
+        self.repeat = repeat
 
         self.usage = "-{} {}".format(name, arg).strip()
+        if (repeat):
+            self.usage += " ..."
+
+    def convert(self, value):
+        '''Convert and validate a flag argument.
+
+           - missing arguments (None) are passed through
+           - raise FlagError if conversion or validation fails
+        '''
+        if (value is None):
+            return value
+
+        if (self.type):
+            try:
+                value = self.type(value)
+            except (TypeError, ValueError):
+                raise FlagError("invalid argument for -{}: {}".format(self.name, value))
+
+        if (self.choices and value not in self.choices):
+            raise FlagError("invalid argument for -{}: {} (choose from {})".format(
+                self.name, value, ', '.join(str(c) for c in self.choices)))
+
+        return value
 
     def parse_out_flag(self, line):
         '''Given an input line check if contains flag and argument.
 
            - if flag/arg exist, remove from line
-           - execute function if defined
            - return tuple of (flag, arg) and edited_line
         '''
-        name_pattern = r'-({})\s*([^\s]+)?'.format(self.name)
-        match = re.search(name_pattern, line)
-        
-        if (not match):
+        matches, leftover = FlagSet((self,)).parse_tokens(line.split())
+
+        if (self.name not in matches):
             #no match found, return line unedited
             return ((), line)
 
-        else:
-            name = match.group(1)
-            arg = match.group(2) if self.arg else ""
+        arg = matches[self.name]
+        if (self.repeat):
+            arg = arg[0]
 
-            # edit out matched flag string 
-            start = match.start(0)
-            end = match.end(0) if self.arg else match.end(1)
-            edited = line[:start] + line[end:].strip()
-            
-            return ((name, arg), edited)
+        return ((self.name, arg), ' '.join(leftover))
 
 
     @staticmethod
@@ -47,19 +71,12 @@ class Flag(object):
         '''Parse out defined flags from input line.
 
            - if matches found, return as dict of {"line": line, "matches": matches"}
+           - prefer compiling a FlagSet once when parsing many lines
         '''
 
         if (not flags): return line
 
-        matches = {}
-        for f in flags:
-            match = f.parse_out_flag(line)
-            if (match[0]):
-                # if match, push {*flag name*: *flag arg*} to dict
-                matches[match[0][0]] = match[0][1]
-                line = match[1]
-
-        return {"line": line, "matches": matches}
+        return FlagSet(flags).parse(line)
 
     @staticmethod
     def merge_usage(flags):
@@ -74,3 +91,108 @@ class Flag(object):
             usage.append("[{}]".format(f.usage))
 
         return ' '.join(usage)
+
+
+class FlagSet(object):
+    '''Compiled set of flags, built once per command.
+
+       - tokenizes a line in a single pass, matching only whole
+         tokens (-f matches, --foo and a-file do not)
+       - flags taking an argument accept "-f value" or "-fvalue"
+       - returns matched flags and the leftover arguments
+    '''
+
+    def __init__(self, flags):
+        self.flags = tuple(flags)
+
+        # first definition of a name wins (subclass flags before globals)
+        self.__lookup = {}
+        for f in self.flags:
+            self.__lookup.setdefault(f.name, f)
+
+        # name lengths of flags that take an argument, for "-fvalue"
+        self.__arg_lengths = sorted(set(len(n) for n, f in self.__lookup.items() if f.arg),
+                                    reverse=True)
+
+    def __iter__(self):
+        return iter(self.flags)
+
+    def __len__(self):
+        return len(self.flags)
+
+    def __contains__(self, name):
+        return name in self.__lookup
+
+    def get(self, name):
+        '''Return flag defined with name, None if not defined.
+        '''
+        return self.__lookup.get(name)
+
+    def match(self, token):
+        '''Check if token is a call to a flag in the set.
+
+           - return tuple of (flag, attached arg) or None
+        '''
+        if (len(token) < 2 or token[0] != '-' or token[1] == '-'):
+            return None
+
+        flag = self.__lookup.get(token[1:])
+        if (flag):
+            return (flag, None)
+
+        for length in self.__arg_lengths:
+            flag = self.__lookup.get(token[1:length+1])
+            if (flag and flag.arg):
+                return (flag, token[length+1:])
+
+        return None
+
+    def parse_tokens(self, tokens, interspersed=True):
+        '''Parse out flags from a list of tokens.
+
+           - return tuple of (matches, leftover tokens)
+           - matches is a dict of {*flag name*: *flag arg*}, a list
+             of args for repeated flags
+           - if not interspersed, stop parsing at first non flag token
+        '''
+        matches = {}
+        leftover = []
+
+        i = 0
+        n = len(tokens)
+        while (i < n):
+            token = tokens[i]
+            i += 1
+
+            found = self.match(token) if (token[:1] == '-') else None
+            if (not found):
+                leftover.append(token)
+                if (not interspersed):
+                    leftover.extend(tokens[i:])
+                    break
+                continue
+
+            flag, arg = found
+            if (flag.arg):
+                # take next token as arg unless it is itself a flag
+                if (arg is None and i < n and not self.match(tokens[i])):
+                    arg = tokens[i]
+                    i += 1
+                value = flag.convert(arg)
+            else:
+                value = ""
+
+            if (flag.repeat):
+                matches.setdefault(flag.name, []).append(value)
+            else:
+                matches[flag.name] = value
+
+        return (matches, leftover)
+
+    def parse(self, line):
+        '''Parse out flags from input line.
+
+           - return as dict of {"line": line, "matches": matches}
+        '''
+        matches, leftover = self.parse_tokens(line.split())
+        return {"line": ' '.join(leftover), "matches": matches}
@@ -1,12 +1,82 @@
-import sys, readline, inspect, subprocess
+import sys, readline, inspect, subprocess, time, atexit, json, hashlib, os, copy, threading
+import functools
+import asyncio, contextvars, signal, cProfile, pstats, contextlib, select, termios, tty
+from concurrent import futures
 from pathlib import Path
 from io import StringIO
-from collections import OrderedDict
+from types import MappingProxyType, MethodType
+from collections import OrderedDict, namedtuple
 
 # self defined modules
-from orecompleter import OreCompleter
-from flag import Flag
-from textstyler import Styler
+from orecompleter import OreCompleter, SuggestionIndex
+from flag import Flag, FlagSet, FlagError
+from textstyler import Styler, Cursor, FrameRenderer
+from oreio import Tee, Capture, FileSink, redirect, current_stdout
+from orehistory import History, HistoryIndex
+from orecache import ResultCache, cache_ttl
+from orestats import PhaseStats
+from orelexer import lex, join_words, LexError
+from oreplugin import load_manifest, entry_point_commands, merge_commands, resolve, PluginError
+from orepool import WorkerPool, WorkerError, isolate_timeout
+
+# dispatch record built once per command when subclass is created
+#   - f: ore_* function, called with the Ore instance
+#   - convention: which of args/flags the ore_* method takes
+#     ("both", "args", "flags" or "none")
+#   - streaming: ore_* method is a generator, each yielded chunk
+#     is output as a line as soon as it is produced
+#   - cache: seconds output of a call is reused for, None if not
+#     cacheable (CACHE marker or orecache.cached)
+#   - piped: ore_* method takes a pipe parameter, the objects output by
+#     the previous command of a pipeline (cmd | cmd)
+#   - plugin: PluginCommand of a plugin command whose module is not
+#     imported yet (record is a placeholder), None otherwise
+#   - isolate: timeout (seconds) of a command run in a worker process,
+#     None if run in process (ISOLATE marker or orepool.isolated)
+Command = namedtuple("Command", ["name", "f", "convention", "flags", "bypass", "group", "streaming",
+                                 "cache", "piped", "plugin", "isolate"])
+
+# job evaluated in the current context (see Ore.async_main_loop)
+_job = contextvars.ContextVar("ore_job", default=None)
+
+# error message of line last evaluated in the current context, if it failed
+_error = contextvars.ContextVar("ore_error", default=None)
+
+# output and error of one task of Ore.fan_out
+TaskResult = namedtuple("TaskResult", ["line", "output", "error"])
+
+# input line parsed once, cached by line (see Ore.__parse_line)
+#   - command: first word of line
+#   - words: words after command (for built-ins)
+#   - stages: Stage per piped subclass command
+#   - shell: bash command output is piped into, "" if none
+#   - redirect: (path, append) of file output is written to, None if none
+#   - error: why line cannot be run, None if it can
+ParsedLine = namedtuple("ParsedLine", ["command", "words", "stages", "shell", "redirect", "error"])
+
+# subclass command of a parsed line, with its args and matched flags
+Stage = namedtuple("Stage", ["record", "args", "flags"])
+
+# frozen per class registry of commands (name -> Command), completers
+# (name -> completer_* function), groups (Ore.groups with groups of
+# plugin commands added) and suggestion index of command and built-in
+# names (None if suggestions are off)
+Registry = namedtuple("Registry", ["commands", "completers", "groups", "suggestions"])
+
+# attributes of an Ore instance its sessions share or set up themselves
+# (see Ore.new_session), all others are deep copied
+_SESSION_SHARED = ("commands", "completer", "flag_input", "history", "result_cache", "phase_stats",
+                   "groups")
+
+# global flags of batch runs (name -> description), a subclass flag of
+# the same name replaces them
+_BATCH_FLAGS = {'b': "batch run", 'e': "stop batch run at first failure"}
+
+# built-in commands handled by Ore.__run_parsed (job built-ins by
+# Ore.async_main_loop only), listed by ?? and completed like commands;
+# a subclass command of the same name takes precedence
+_BUILTINS = ("help", "history", "map", "cache", "stats", "profile", "watch", "jobs", "fg", "kill")
+_JOB_BUILTINS = ("jobs", "fg", "kill")
 
 class Ore(object):
     intro = "Welcome. Type ? or help  for documentation, ?? for list of commands."
@@ -16,129 +86,469 @@ class Ore(object):
     flags = []
     __flags = [Flag('f', 'Save output from commands to file.', 'filename'),
                Flag('s', 'Silence output from commands.'),
-               Flag('r', 'Build a readme file.')]
+               Flag('r', 'Build a readme file.'),
+               Flag('b', 'Run commands from file (- for stdin) and exit.', 'filename'),
+               Flag('e', 'Stop batch run at first failed command.')]
     
     groups = []
 
+    # flags of history built-in
+    __history_flags = FlagSet([Flag('p', 'Prefix search.'),
+                               Flag('z', 'Fuzzy search.'),
+                               Flag('n', 'Number of results.', 'count', type=int)])
 
+    # flags of map built-in
+    __map_flags = FlagSet([Flag('j', 'Number of parallel tasks.', 'jobs', type=int),
+                           Flag('u', 'Show output as tasks complete (unordered).'),
+                           Flag('a', 'Read argument sets from file, one per line.', 'filename')])
 
-    def __init__(self):
-        
-        ## create .history if doesn't exist; save to user home dir
-        self.__history_path = str(Path.home()) + '/.' + self.__class__.__name__ + '_history'
-        if (not Path(self.__history_path).is_file()): open(self.__history_path, 'w').close()
+    # flags of profile built-in
+    __profile_flags = FlagSet([Flag('n', 'Number of functions shown.', 'count', type=int),
+                               Flag('c', 'Show callers of the functions shown.')])
 
-        ## read in saved history commands
-        readline.read_history_file(self.__history_path)
+    # flags of watch built-in
+    __watch_flags = FlagSet([Flag('n', 'Seconds between runs.', 'secs', type=float),
+                             Flag('c', 'Stop after count runs.', 'count', type=int)])
 
-        ## get defined commands
-        self.commands = {}
-        completers = {}
-        members = inspect.getmembers(self, predicate=inspect.ismethod)
-        for m in members:
-            name = m[0]
-            f = m[1]
-            # defined commands are of pattern "ore_<command>"
-            if (name.startswith("ore_")):
-                self.commands[name[4:]] = f
-            
-            # completer methods are of pattern "completer_<command>"
-            elif (name.startswith("completer_")):
-                completers[name[10:]] = f
+    # -f output file: buffer size, flush policy ("command", "interval"
+    # or "exit") and size based rotation of segments
+    sink_buffer_size = 65536
+    sink_flush = "command"
+    sink_flush_interval = 1.0
+    sink_max_bytes = 0
+    sink_backups = 5
+    sink_compress = False
 
+    # completers marked BACKGROUND (or async) get at most background_budget
+    # seconds per Tab press, cached candidates refreshed after background_refresh
+    background_budget = 0.05
+    background_refresh = 30.0
 
+    # seconds results of other completers are reused (and narrowed) for
+    completion_ttl = 5.0
 
-        ## setup completer
-        self.completer = OreCompleter(list(self.commands.keys()))
-        
-        # check if any subclass completers have been set
-        for c in completers.keys():
-            # raise exception if c not a defined command (ore_<command>)
-            if (c not in self.commands):
-                raise Exception("cannot set completer of undefined command ({})".format(c))
+    # keep rendered docs in ~/.<class>_docs between sessions
+    docs_cache = True
+
+    # worker threads evaluating lines in async_main_loop
+    async_workers = 32
+
+    # ~/.<class>_history: max entries kept, seconds between writes
+    # (checked as lines are added; entries still pending when the
+    # session goes idle are written when the main loop exits)
+    history_length = 10000
+    history_flush_interval = 5.0
+
+    # cacheable commands: default seconds results are reused for, max
+    # results and characters of output held (shared by all sessions)
+    cache_ttl = 60.0
+    cache_size = 256
+    cache_max_bytes = 16*1024*1024
 
-            self.completer.set_command_completer(c, completers[c])
+    # record per phase timings from start (see stats built-in)
+    instrument = False
+
+    # parsed input lines kept (LRU), repeated lines skip parsing
+    parse_cache_size = 512
+
+    # plugin commands: manifests (dicts or JSON file paths, see
+    # oreplugin.load_manifest) and entry point group, modules are
+    # imported on first use of one of their commands
+    plugins = []
+    plugin_group = None
+
+    # isolated commands: worker processes kept forked, default seconds
+    # a run may take
+    isolate_workers = 2
+    isolate_timeout = 60.0
+
+    # True in worker processes, where isolated commands run in process
+    __in_worker = False
+
+    # unrecognized commands: max edits of "did you mean" suggestions (0
+    # for none), run the closest suggestion if it is the only one
+    suggest_distance = 2
+    auto_correct = False
+
+    # default seconds between runs of watch built-in
+    watch_interval = 2.0
+
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        ## discover commands once per subclass
+        cls.__registry = cls.__build_registry()
+
+        ## subclass flags take precedence over global batch flags
+        for f in cls.flags:
+            if (f.name in _BATCH_FLAGS):
+                print("WARNING: {}: flag -{} replaces Ore flag -{} ({})".format(
+                      cls.__name__, f.name, f.name, _BATCH_FLAGS[f.name]), file=sys.stderr)
+
+
+    def __init__(self):
 
-        readline.set_completer(self.completer.complete)
+        # event loop of async_main_loop() while running
+        self.__loop = None
+
+        # worker processes of isolated commands (see __start_template)
+        self.__pool = None
+
+        ## bind commands from class registry
+        registry = self.__registry
+        # records of plugin commands are replaced once imported
+        self.__dispatch = dict(registry.commands)
+        self.__bind_commands()
 
         ## record/execute any flags passed in
-        line = ' '.join(sys.argv[1:])
-        self.flag_input = Flag.parse_out_flags(line, self.flags + self.__flags)["matches"]
+        self.__flagset = FlagSet(self.flags + self.__flags)
+        self.flag_input = self.__flagset.parse_tokens(sys.argv[1:])[0]
         
-        for f in self.flags + self.__flags:
+        for f in self.__flagset:
             if (f.name in self.flag_input):
                 self.__exec_flag_func(f, self.flag_input[f.name])
 
-        ## convert groups to an ordereddict
-        self.groups = OrderedDict(self.groups)
+        ## batch mode only by the global flags, not subclass flags of
+        ## the same name
+        self.__batch_file = self.__global_flag_arg('b')
+        self.__stop_on_error = self.__global_flag_arg('e') is not None
+
+        # -f output file, opened last
+        self.__sink = None
+
+        ## batch runs skip readline and history entirely
+        self.history = None
+        self.__history_index = None
+        self.__history_results = []
+        if (self.__batch_file is None):
+            # read in saved history commands; save to user home dir
+            self.history = self.__open_history()
+            for entry in self.history.load():
+                readline.add_history(entry)
+
+            readline.set_completer(self.completer.complete)
+
+        ## results of cacheable commands
+        self.result_cache = ResultCache(self.cache_size, self.cache_max_bytes)
+
+        ## per phase timings of evaluated lines
+        self.phase_stats = PhaseStats(self.instrument)
 
-        ## generate docs
-        self.docs = self.compile_docs()        
+        ## parsed lines, by line
+        self.__parse = functools.lru_cache(self.parse_cache_size)(self.__parse_line)
+
+        ## convert groups to an ordereddict, with groups of plugin commands
+        self.groups = OrderedDict((g, list(c)) for g, c in registry.groups.items())
+
+        ## docs are compiled on first use
+        self.__docs = None
+        self.__doc_cache = None
+        self.__docs_path = str(Path.home()) + '/.' + self.__class__.__name__ + '_docs'
         
         ## check if generating readme
         if ('r' in self.flag_input):
             self.compile_readme()
 
         ## bind tab to autocomplete
-        readline.parse_and_bind("tab: complete")
+        if (self.__batch_file is None):
+            readline.parse_and_bind("tab: complete")
+
+        ## fork template of isolated command workers before any thread
+        ## (e.g. writer of the -f output file) is started
+        self.__start_template()
+
+        ## open -f output file once for the session
+        self.__sink = self.__open_sink()
+        if (self.__sink):
+            atexit.register(self.close)
 
 
     def main_loop(self):
-        
+
+        ## run batch file and exit if -b given
+        if (self.__batch_file is not None):
+            self.__batch_loop(self.__batch_file)
+            return
+
+        self.__start_workers()
         self.preloop()
 
         print(self.intro)
 
-        while (True):
-            line = input(self.prompt)
-            if (line):
-                line = self.precmd(line)
-                if (not self.__evaluate(line)): break 
-                self.postcmd(line)
-                readline.append_history_file(1, self.__history_path)
+        # pending history and -f output are written however the loop
+        # ends (quit, Ctrl-D, Ctrl-C)
+        try:
+            while (True):
+                line = input(self.prompt)
+                if (line):
+                    entry = line
+                    line = self.precmd(line)
+                    if (not self.__evaluate(line)): break 
+                    self.postcmd(line)
+                    self.__add_history(entry)
+                else:
+                    self.emptyline()
+
+            self.postloop()
+        finally:
+            self.close()
+
+
+    def async_main_loop(self):
+        '''Run main loop on an asyncio event loop.
+
+           - async def ore_* commands run on the event loop
+           - a line ending in & runs as a background job with its
+             output captured; jobs, fg [n] and kill [n] manage jobs
+           - Ctrl-C cancels the foreground command only
+        '''
+
+        ## run batch file and exit if -b given
+        if (self.__batch_file is not None):
+            self.__batch_loop(self.__batch_file)
+            return
+
+        self.__start_workers()
+        try:
+            asyncio.run(self.__async_loop())
+        finally:
+            self.close()
+
+
+    def run_lines(self, lines, stop_on_error=False):
+        '''Execute commands from an iterable of lines, without readline
+        or history.
+
+           - lines are streamed; blank lines and # comments are skipped
+           - a line fails if its command raises, is unrecognized or
+             has invalid flags
+           - stop at first failed line if stop_on_error, else continue
+           - quit command ends the run
+           - return BatchReport of per-line status and throughput
+        '''
+        report = BatchReport()
+
+        for lineno, line in enumerate(lines, 1):
+            line = line.strip()
+            if (not line or line.startswith('#')):
+                report.add(lineno, line, BatchReport.SKIPPED)
+                continue
+
+            running, error = self.execute(line)
+            if (error):
+                report.add(lineno, line, BatchReport.FAILED, error)
+                if (stop_on_error): break
+            elif (not running):
+                report.add(lineno, line, BatchReport.QUIT)
+                break
             else:
-                self.emptyline()
+                report.add(lineno, line, BatchReport.OK)
 
-        self.postloop()
+        report.finish()
+        return report
+
+
+    def execute(self, line):
+        '''Execute line as if entered at the prompt, without readline or
+        history.
+
+           - exceptions raised by the command are reported, not raised
+           - return tuple of (keep running, error message or None)
+        '''
+        _error.set(None)
+        try:
+            line = self.precmd(line)
+            running = self.__evaluate(line)
+            self.postcmd(line)
+        except Exception as e:
+            _error.set("{}: {}".format(e.__class__.__name__, e))
+            running = True
+
+        return (running, _error.get())
+
+
+    def new_session(self, argv=()):
+        '''Return a session of this instance for serving a client.
+
+           - session is a copy sharing dispatch table, result cache,
+             stats and docs, with its own flags (parsed from argv, e.g.
+             -s or -f filename), -f output file and history, and its
+             own commands and completers bound to it
+           - other attributes are deep copied (shared only if they
+             cannot be, e.g. locks or sockets), so attributes commands
+             assign or change stay within the session
+           - close() the session when done
+        '''
+        session = copy.copy(self)
+        session.__bind_commands()
+
+        for name, value in vars(self).items():
+            if (name.startswith("_Ore__") or name in _SESSION_SHARED):
+                continue
+            try:
+                setattr(session, name, copy.deepcopy(value))
+            except (TypeError, copy.Error):
+                pass
+
+        session.flag_input = self.__flagset.parse_tokens(list(argv))[0]
+        for f in self.__flagset:
+            if (f.name in session.flag_input):
+                session.__exec_flag_func(f, session.flag_input[f.name])
+
+        session.__sink = session.__open_sink()
+        session.history = session.__open_history()
+        session.history.load()
+        session.__history_index = None
+        session.__history_results = []
+
+        return session
+
+
+    def serve(self, path=None):
+        '''Serve sessions of this instance to clients over a Unix socket
+        until interrupted (Ctrl-C).
+
+           - path defaults to ~/.<class>.sock
+           - connect with: python3 oreserver.py [path] [flags]
+           - see oreserver.OreServer
+        '''
+        from oreserver import OreServer
+
+        if (not path):
+            path = str(Path.home()) + '/.' + self.__class__.__name__ + '.sock'
+
+        # compile docs once, shared by every session
+        self.docs
+
+        with OreServer(self, path) as server:
+            print("Serving {} on {}".format(self.__class__.__name__, path))
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                print()
+
+        self.close()
+
+
+    def close(self):
+        '''Release session resources: flush and close the -f output file,
+        write pending history entries.
+
+           - called however main_loop() exits, safe to call more than once
+        '''
+        if (self.__sink):
+            self.__sink.close()
+
+        if (self.history):
+            self.history.close()
+
+        if (self.__history_index):
+            self.__history_index.update()
+            self.__history_index.save()
+
+
+    def fan_out(self, line, argsets, jobs=4, ordered=True):
+        '''Evaluate line once per argument set on a pool of threads.
+
+           - line is a string, or a sequence of words
+           - each argument set (a string, or a sequence of strings for
+             several arguments) replaces {} in line, or is appended;
+             arguments are quoted so the lexer reads them back as given
+           - output of each task is captured separately
+           - yield TaskResult(line, output, error) per task, in input
+             order if ordered, otherwise as tasks complete
+           - a failing task does not stop the others
+        '''
+        lines = [_fill(line, (a,) if isinstance(a, str) else tuple(a)) for a in argsets]
+
+        with futures.ThreadPoolExecutor(max(jobs, 1), thread_name_prefix="ore-map") as pool:
+            tasks = [pool.submit(contextvars.Context().run, self.__run_task, l) for l in lines]
+
+            for task in (tasks if ordered else futures.as_completed(tasks)):
+                yield task.result()
 
 
     def default(self, line):
         '''Executes if user input is unrecognized.
             
            - Attempt to autocomplete with list of known commands first.
+           - Then suggest commands within suggest_distance edits (run
+             the closest one if auto_correct and it is the only one).
            - Ore default behavior just gives user and error message.
         '''
         # Try to autocomplete command first
-        parts = line.split()
-        state = 0
-        commands = []
-        while True:
-            command = self.completer.complete(parts[0], state)
-            if (command):
-                commands.append(command)
-                state += 1
-            else:
-                break
+        parts = line.split(None, 1)
+        if (not parts): return
+        commands = self.completer.command_matches(parts[0])
 
         if (len(commands) == 1):
             parts[0] = commands[0]
             self.__evaluate(' '.join(parts))
+            return
         elif (len(commands) > 1):
             for c in commands:
                 print('{}\t'.format(c), end="")
             print()
+            return
+
+        index = self.__registry.suggestions
+        suggestions = index.suggest(parts[0]) if (index) else []
+        closest = [c for c, distance in suggestions if distance == suggestions[0][1]]
+
+        if (self.auto_correct and len(closest) == 1):
+            print("Running {} ({} unrecognized).".format(closest[0], parts[0]))
+            parts[0] = closest[0]
+            self.__evaluate(' '.join(parts))
+        elif (suggestions):
+            _error.set("command unrecognized")
+            print("Error: command unrecognized. Did you mean {}?".format(
+                  ', '.join(c for c, distance in suggestions)))
         else:
+            _error.set("command unrecognized")
             print("Error: command unrecognized. ? for help.")
 
 
+    def suggest(self, word, limit=5):
+        '''Return commands (and built-ins) within suggest_distance edits
+        of word, closest first.
+        '''
+        suggestions = self.__registry.suggestions
+        if (not suggestions): return []
+        return [c for c, distance in suggestions.suggest(word, limit=limit)]
+
+
+    def invalidate_cache(self, command=None):
+        '''Drop cached results of command (all commands if None), e.g.
+        after a command changed what cached commands report.
+
+           - return number of results dropped
+        '''
+        return self.result_cache.invalidate(command)
+
+
     def emptyline(self):
         '''Executes if no input received from user.
         
            - Ore default behavior repeats last entered command.
         '''
-        self.__evaluate(readline.get_history_item(readline.get_current_history_length()))
+        if (self.history and self.history.entries):
+            self.__evaluate(self.history.entries[-1])
         
         
+    @property
+    def docs(self):
+        '''Full documentation, compiled on first use.
+        '''
+        if (self.__docs is None):
+            self.__docs = self.compile_docs()
+        return self.__docs
+
+    @docs.setter
+    def docs(self, docs):
+        self.__docs = docs
+
+
     def show_docs(self):
         '''Present documentation based on user defined
            methods and docstrings.
@@ -157,9 +567,11 @@ class Ore(object):
     
         # get each command docs and group together by defined groups
         for command in sorted(self.commands):
-            group = self.__get_group_from_command(command)
+            group = self.__dispatch[command].group
             group_docs[group].append(command)
 
+        group_docs["Built-ins"] = self.__builtins()
+
         for g in group_docs:
             print('\n{}\n{}'.format(g, '='*15))
 
@@ -204,7 +616,7 @@ class Ore(object):
         '''
 
         #get formatted class docs
-        docs = ['', self.__get_class_docs(),
+        docs = ['', self.__get_class_docs(save=False),
                 "{0}\n## COMMANDS\n{0}\n".format('='*25)]
         
         # initialize dictionary for grouped commands
@@ -215,8 +627,9 @@ class Ore(object):
     
         # get each command docs and group together by defined groups
         for command in sorted(self.commands):
-            group = self.__get_group_from_command(command)
-            group_docs[group].append(self.__get_command_docs(command))
+            group = self.__dispatch[command].group
+            group_docs[group].append(self.__get_command_docs(command, save=False))
+        self.__save_doc_cache()
 
         # add command docs to master docs by group name
         for group in group_docs:
@@ -244,154 +657,1270 @@ class Ore(object):
     ## HELPER FUNCTIONS ##
     ######################
 
+    def __bind_commands(self):
+        '''Bind commands and completers of the class registry to this
+        instance (commands, completer).
+        '''
+        registry = self.__registry
+        self.commands = {}
+        for command, record in registry.commands.items():
+            self.commands[command] = MethodType(record.f, self)
+
+        ## setup completer, built-ins complete like commands
+        self.completer = OreCompleter(list(self.commands.keys()) + self.__builtins(),
+                                      ttl=self.completion_ttl)
+        
+        # check if any subclass completers have been set
+        for c in registry.completers:
+            # raise exception if c not a defined command (ore_<command>)
+            if (c not in self.commands):
+                raise Exception("cannot set completer of undefined command ({})".format(c))
+
+            f = MethodType(registry.completers[c], self)
+            background = inspect.iscoroutinefunction(f) or "BACKGROUND" in (f.__doc__ or '')
+            self.completer.set_command_completer(c, f, background, self.background_budget,
+                                                 self.background_refresh)
+
+
+    def __builtins(self):
+        '''Return built-in commands not overridden by subclass commands.
+        '''
+        return [b for b in _BUILTINS if b not in self.__registry.commands]
+
+
+    def __global_flag_arg(self, name):
+        '''Return arg given to global flag name ("" if it takes none),
+        None if not given or name is a subclass flag.
+        '''
+        flag = self.__flagset.get(name)
+        if (name not in self.flag_input or not any(flag is f for f in self.__flags)):
+            return None
+        return self.flag_input[name] or ""
+
+
+    def __open_sink(self):
+        '''Open -f output file given in flag input, None if not given.
+        '''
+        if (not self.flag_input.get('f')):
+            return None
+
+        return FileSink(self.flag_input['f'], self.sink_buffer_size, self.sink_flush,
+                        self.sink_flush_interval, self.sink_max_bytes,
+                        self.sink_backups, self.sink_compress)
+
+
+    def __open_history(self):
+        '''Return (unloaded) History of ~/.<class>_history.
+        '''
+        return History(str(Path.home()) + '/.' + self.__class__.__name__ + '_history',
+                       self.history_length, self.history_flush_interval)
+
+
+    def __add_history(self, entry):
+        '''Add entry to history, dropping consecutive duplicates.
+        '''
+        if (not self.history.add(entry)):
+            # drop consecutive duplicate readline added
+            length = readline.get_current_history_length()
+            if (length > 1 and readline.get_history_item(length) == entry):
+                readline.remove_history_item(length - 1)
+
+
+    async def __async_loop(self):
+        '''Read and evaluate lines; evaluation runs in worker threads
+        so the event loop stays free for async commands and jobs.
+        '''
+        loop = asyncio.get_running_loop()
+        self.__loop = loop
+        self.__executor = futures.ThreadPoolExecutor(self.async_workers, thread_name_prefix="ore-job")
+        self.__jobs = OrderedDict()
+        self.__job_count = 0
+        self.__foreground = None
+        loop.add_signal_handler(signal.SIGINT, self.__interrupt)
+
+        self.preloop()
+
+        print(self.intro)
+
+        try:
+            while (True):
+                try:
+                    line = await loop.run_in_executor(None, input, self.prompt)
+                except EOFError:
+                    print()
+                    break
+
+                self.__report_jobs()
+
+                if (not line):
+                    await self.__run_foreground(self.emptyline)
+                    continue
+
+                entry = line
+                line = self.precmd(line)
+                words = line.split()
+
+                if (line.rstrip().endswith('&')):
+                    self.__start_job(line.rstrip()[:-1].rstrip())
+                elif (words and words[0] in _JOB_BUILTINS and words[0] not in self.__dispatch):
+                    await self.__manage_jobs(words[0], words[1:])
+                else:
+                    if (not await self.__run_foreground(self.__evaluate, line)): break
+                    self.postcmd(line)
+
+                self.__add_history(entry)
+        finally:
+            loop.remove_signal_handler(signal.SIGINT)
+            for job in self.__jobs.values():
+                if (job.coroutine): job.coroutine.cancel()
+            self.__executor.shutdown(wait=False)
+            self.__loop = None
+
+        self.postloop()
+
+
+    def __run_in_job(self, job, f, *args):
+        '''Run f in job's context, output captured if job runs in the
+        background.
+        '''
+        _job.set(job)
+        if (job.number):
+            with redirect(job.output):
+                return f(*args)
+        return f(*args)
+
+
+    def __submit_job(self, job, f, *args):
+        '''Run f for job in a worker thread in a fresh context.
+        '''
+        context = contextvars.Context()
+        job.future = self.__loop.run_in_executor(self.__executor, context.run,
+                                                 self.__run_in_job, job, f, *args)
+        # exceptions are reported by status(), never left unretrieved
+        job.future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return job.future
+
+
+    async def __run_foreground(self, f, *args):
+        '''Run f in the foreground, return its result (True if cancelled).
+        '''
+        job = Job(0, '')
+        self.__foreground = job
+        try:
+            return await self.__submit_job(job, f, *args)
+        except (futures.CancelledError, asyncio.CancelledError):
+            print("Cancelled.")
+            return True
+        finally:
+            self.__foreground = None
+
+
+    def __start_job(self, line):
+        '''Start evaluating line as a background job.
+        '''
+        self.__job_count += 1
+        job = Job(self.__job_count, line)
+        self.__jobs[job.number] = job
+        self.__submit_job(job, self.__evaluate, line)
+        print("[{}] {}".format(job.number, line))
+
+
+    async def __manage_jobs(self, command, args):
+        '''jobs: list jobs, fg [n]: wait for job and show its output,
+        kill [n]: cancel job (last job if no n given).
+        '''
+        if (command == "jobs"):
+            for job in self.__jobs.values():
+                print("[{}] {:<10} {}".format(job.number, job.status(), job.line))
+            return
+
+        try:
+            job = self.__jobs[int(args[0])] if args else next(reversed(self.__jobs.values()))
+        except (ValueError, KeyError, StopIteration):
+            print("Error: no such job.")
+            return
+
+        if (command == "kill"):
+            if (job.future.done()):
+                print("[{}] {:<10} {}".format(job.number, job.status(), job.line))
+            elif (job.kill()):
+                print("[{}] {:<10} {}".format(job.number, "Killed", job.line))
+            else:
+                print("Error: job {} is not running an async command, cannot be killed.".format(job.number))
+            return
+
+        # fg: job becomes foreground, Ctrl-C cancels it
+        self.__foreground = job
+        try:
+            await asyncio.wait([job.future])
+        finally:
+            self.__foreground = None
+
+        del self.__jobs[job.number]
+        print(job.output.getvalue(), end="")
+        if (job.status() == "Failed"):
+            e = job.future.exception()
+            print("Error: {}: {}".format(e.__class__.__name__, e))
+        elif (job.status() == "Killed"):
+            print("Cancelled.")
+
+
+    def __report_jobs(self):
+        '''Print status of jobs finished since last report.
+        '''
+        for job in self.__jobs.values():
+            if (job.future.done() and not job.reported):
+                job.reported = True
+                print("[{}] {:<10} {}".format(job.number, job.status(), job.line))
+
+
+    def __interrupt(self):
+        '''Ctrl-C handler of async_main_loop: cancel foreground command.
+        '''
+        job = self.__foreground
+        if (not job):
+            print()
+            return
+
+        if (not job.kill()):
+            print("\nWARNING: cannot cancel a synchronous command, waiting for it to finish.")
+
+
+    def __run_coroutine(self, coro):
+        '''Run coroutine of an async ore_* command to completion.
+
+           - in async_main_loop, run on its event loop (cancellable by
+             Ctrl-C or kill) while the evaluating worker thread waits
+           - otherwise run on a new event loop
+        '''
+        if (not self.__loop):
+            return asyncio.run(coro)
+
+        future = asyncio.run_coroutine_threadsafe(_redirected(coro, current_stdout()), self.__loop)
+
+        job = _job.get()
+        if (job): job.coroutine = future
+        try:
+            return future.result()
+        finally:
+            if (job): job.coroutine = None
+
+
+    def __batch_loop(self, filename):
+        '''Run commands from filename (- for stdin), report to stderr
+        and exit with status 1 if any line failed.
+        '''
+        self.__start_workers()
+        self.preloop()
+
+        if (filename == '-'):
+            report = self.run_lines(sys.stdin, self.__stop_on_error)
+        else:
+            with open(filename) as script:
+                report = self.run_lines(script, self.__stop_on_error)
+
+        self.postloop()
+        self.close()
+
+        sys.stdout.flush()
+        print(report.summary(), file=sys.stderr)
+
+        if (report.failed):
+            sys.exit(1)
+
+
     def __evaluate(self, line):
         '''Evaluate line command.
         
-           - check if bash command entered and split line into subclass
-             command and bash command.
-           - split subclass command string into command and arguments
-             and execute command
+           - parse line (see __parse_line), from parse cache if line was
+             parsed before
+           - execute built-in or subclass command with its arguments
+           - if subclass commands are piped into each other, connect
+             them so objects flow from one to the next
            - if bash string present, pass output from subclass command to
              input of bash string and execute
-           - check if flags defined on input and if any passed to line input
-           - if flags present, parse out
+           - if redirected (> or >>), write output straight to file
         '''
 
-        ## check for presence of bash command
-        line = self.__split_bash(line)
-        command_string = line[0]
-        bash_string = line[1] if len(line) > 1 else ""
-        
-        ## get command and arguments
-        parts = command_string.split(' ', 1)
-        command = parts[0]
-        
-        # check if any flags defined
-        def_flags = self.__get_flags(command)
-
-        # check if flags passed in through input
-        args = []
-        matched_flags = {}
-        if (len(parts) > 1):
-            if (def_flags):
-                flag_search = Flag.parse_out_flags(parts[1], def_flags)
-                matched_flags = flag_search["matches"]
-                parsed = flag_search["line"]
-            else:
-                parsed = parts[1]
-            args = parsed.split(self.split_pattern) if parsed else []
-                
-                
-        ## check for predefined commands
+        stats = self.phase_stats
+        timed = stats.enabled
+        if (timed): mark = stats.clock()
+
+        parsed = self.__parse(line)
+        if (parsed.error):
+            _error.set(parsed.error)
+            print("Error: {}".format(parsed.error))
+            return True
+
+        if (timed): stats.add("parse", mark)
+
+        if (not parsed.redirect):
+            return self.__run_parsed(parsed, line)
+
+        path, append = parsed.redirect
+        try:
+            f = open(path, 'a' if append else 'w')
+        except OSError as e:
+            _error.set(str(e))
+            print("Error: {}".format(e))
+            return True
+
+        with f, redirect(f):
+            return self.__run_parsed(parsed, line, to_file=True)
+
+
+    def __run_parsed(self, parsed, line, to_file=False):
+        '''Execute parsed line, return False if quit.
+
+           - if to_file, output goes straight to the redirected file,
+             not to the console or -f file
+        '''
+        command = parsed.command
+        words = parsed.words
+
+        ## check for predefined commands, unless a subclass command of
+        ## the same name overrides them
+        builtin = command if (command not in self.__dispatch) else None
         if (command == "quit"):
-            self.ore_quit(args)
+            self.ore_quit(list(words))
             return False
-        elif (command == "?" or command == "help"):
-            if (args and args[0] in self.commands):
-                print(self.__get_command_docs(args[0]));
+        elif (builtin == "?" or builtin == "help"):
+            if (words and words[0] in self.commands):
+                print(self.__get_command_docs(words[0]));
             else:
                 self.show_docs()
 
-        elif (command == "??"):
+        elif (builtin == "??"):
             self.show_mini_docs()
+
+        elif (builtin == "history"):
+            self.__search_history(words)
+
+        elif (builtin == "map"):
+            self.__map(words)
+
+        elif (builtin == "cache"):
+            self.__manage_cache(words)
+
+        elif (builtin == "stats"):
+            self.__show_stats(words)
+
+        elif (builtin == "profile"):
+            self.__profile(words)
+
+        elif (builtin == "watch"):
+            self.__watch(words)
+
+        elif (builtin in _JOB_BUILTINS):
+            _error.set("{} is only available in async_main_loop".format(builtin))
+            print("Error: {} is only available in async_main_loop.".format(builtin))
+
+        elif (command[:1] == "!" and command[1:].isdigit()):
+            n = int(command[1:])
+            if (0 < n <= len(self.__history_results)):
+                return self.__evaluate(self.__history_results[n-1])
+            _error.set("no history result {}".format(n))
+            print("Error: no history result {}. history to search.".format(n))
         
         else:
 
             ## check for subclass commands
-            if (command in self.commands):
+            stage = parsed.stages[0]
+            record = stage.record
+            if (record):
+                # parsed lines are cached, give command its own copies
+                args = list(stage.args)
+                matched_flags = _copy_flags(stage.flags)
+                pipe = None
+                if (len(parsed.stages) > 1):
+                    record, args, matched_flags, pipe = self.__connect(parsed.stages)
+
                 ## send command output to bash command if bash command given
-                if (bash_string):
-                    self.__bash(command, args, matched_flags, bash_string) 
+                if (parsed.shell):
+                    self.__bash(record, args, matched_flags, parsed.shell, pipe) 
+                elif (to_file):
+                    self.__exec_command(record, args, matched_flags, pipe)
                 else:
-                    if ("BYPASS" in self.commands[command].__doc__):
+                    if (record.bypass):
                         print("WARNING: Bypassing any silenced output or writes to file.")
-                        self.__exec_command(command, args, matched_flags);
+                        self.__exec_command(record, args, matched_flags, pipe);
+                    elif (record.streaming or record.isolate is not None):
+                        # isolated commands stream output as it comes back
+                        self.__stream(record, args, matched_flags, pipe)
                     else:
-                        out_string = self.__get_stdout(command, args, matched_flags)
+                        stats = self.phase_stats
+                        timed = stats.enabled
+
+                        out_string = self.__get_stdout(record, args, matched_flags, pipe)
+                        if (timed): mark = stats.clock()
 
                         if ('s' not in self.flag_input):
                             # end="" to remove single \n character that
                             # gets added from __get_stdout call
                             print(out_string, end="")
+                        if (timed): mark = stats.add("capture", mark)
 
-                        if ('f' in self.flag_input):
-                            with open(self.flag_input['f'], 'a') as out:
-                                out.write(out_string)
+                        if (self.__sink):
+                            self.__sink.write(out_string)
+                            self.__sink.end_command()
+                            if (timed): stats.add("sink", mark)
 
             else:
-                self.default(' '.join(line))
+                self.default(line)
 
         return True
 
 
-    def __split_bash(self, line):
-        '''Split line into subclass command string and bash string if
-        exists.
+    def __parse_line(self, line):
+        '''Parse line into a ParsedLine, in a single pass of the lexer.
+
+           - words are split on whitespace, with quoting (see
+             orelexer.lex)
+           - piped subclass commands taking a pipe parameter become
+             stages, the line from the first piped word that is not one
+             is a bash command (even if it names a subclass command)
+           - flags of each subclass command are matched and converted
+           - plugin commands are imported on first use
+           - errors (bad quoting, invalid flags, plugin not importable)
+             are kept in error
+           - results are cached by line (see __parse), never modify them
+        '''
+        try:
+            segments, shell = lex(line, self.__is_stage)
+        except LexError as e:
+            return ParsedLine('', (), (), "", None, str(e))
+
+        first = segments[0].words
+        command = first[0] if first else ''
+        words = first[1:]
+
+        if (len(segments) == 1 and not shell):
+            # common case, a single command
+            record = self.__dispatch.get(command)
+            try:
+                if (record and record.plugin):
+                    record = self.__load_plugin(command)
+                args, flags = self.__parse_args(record, words)
+            except (FlagError, PluginError) as e:
+                return ParsedLine(command, words, (), "", None, str(e))
+            return ParsedLine(command, words, (Stage(record, args, flags),), "",
+                              segments[0].redirect, None)
+
+        if (shell and segments[-1].redirect or any(s.redirect for s in segments[:-1])):
+            return ParsedLine(command, words, (), shell, None, "redirect (> file) must end the line")
+
+        try:
+            stages = []
+            for segment in segments:
+                record = self.__dispatch.get(segment.words[0]) if segment.words else None
+                if (record and record.plugin):
+                    record = self.__load_plugin(record.name)
+
+                args, flags = self.__parse_args(record, segment.words[1:])
+                stages.append(Stage(record, args, flags))
+        except (FlagError, PluginError) as e:
+            return ParsedLine(command, words, (), shell, None, str(e))
+
+        return ParsedLine(command, words, tuple(stages), shell, segments[-1].redirect, None)
+
+
+    def __is_stage(self, command):
+        '''Return True if command can read a pipe of objects from the
+        subclass command before it, False if piping into it is left to
+        the shell.
+
+           - plugin commands are imported to find out (an import error
+             is reported as that of a stage)
         '''
-        parts = line.split("|", 1)
-        return parts
+        record = self.__dispatch.get(command)
+        if (record and record.plugin):
+            try:
+                record = self.__load_plugin(command)
+            except PluginError:
+                return True
+
+        return bool(record and record.piped)
+
+
+    def __parse_args(self, record, words):
+        '''Match flags of command in words, return tuple of (args,
+        matched flags).
+
+           - raise FlagError if flags are invalid
+        '''
+        if (record and record.flags.flags):
+            matched_flags, leftover = record.flags.parse_tokens(list(words))
+        else:
+            matched_flags, leftover = {}, words
+
+        if (self.split_pattern == ' '):
+            return (tuple(leftover), matched_flags)
+
+        # args split on custom pattern instead of whitespace
+        joined = ' '.join(leftover)
+        return (tuple(joined.split(self.split_pattern)) if joined else (), matched_flags)
+
+
+    def __connect(self, stages):
+        '''Connect subclass commands of a pipeline.
+
+           - each command reads the objects output by the one before it
+             from its pipe parameter, lazily
+           - return (record, args, flags, pipe) of last command
+        '''
+        pipe = None
+        for stage in stages[:-1]:
+            pipe = self.__produce(stage.record, list(stage.args), _copy_flags(stage.flags), pipe)
+
+        last = stages[-1]
+        return (last.record, list(last.args), _copy_flags(last.flags), pipe)
+
+
+    def __produce(self, record, args, flags, pipe):
+        '''Yield objects output by command as input of the next command
+        in a pipeline.
+
+           - streaming (generator) commands: their yielded objects, as
+             they are consumed
+           - other commands: lines of their printed output
+        '''
+        self.__exec_flag_funcs(record, flags)
+
+        if (record.streaming):
+            yield from self.__invoke(record, args, flags, pipe)
+            return
+
+        with redirect(Capture()) as out:
+            self.__invoke(record, args, flags, pipe)
+        yield from out.getvalue().splitlines()
+
+
+    def __search_history(self, words):
+        '''Print numbered history entries, !<number> re-runs one.
+
+           - no query: last entries of history
+           - query: substring, prefix (-p) or fuzzy (-z) search over
+             all history ever indexed, ranked by frequency and recency
+           - -n count limits number of results (default 20)
+        '''
+        if (not self.history):
+            _error.set("history not available")
+            print("Error: history not available.")
+            return
+
+        try:
+            flags, query = self.__history_flags.parse_tokens(list(words))
+        except FlagError as e:
+            _error.set(str(e))
+            print("Error: {}".format(e))
+            return
+
+        query = ' '.join(query)
+        limit = flags.get('n') or 20
+
+        if (not query):
+            results = list(self.history.entries)[-limit:]
+        else:
+            # index is loaded on first search, then kept up to date
+            if (not self.__history_index):
+                self.__history_index = HistoryIndex(self.history.path)
+                self.__history_index.load()
+            self.history.flush()
+            self.__history_index.update()
+
+            mode = "prefix" if 'p' in flags else "fuzzy" if 'z' in flags else "substring"
+            results = self.__history_index.search(query, mode, limit)
+
+        self.__history_results = results
+        for i, entry in enumerate(results, 1):
+            print("{:>4}  {}".format(i, entry))
+
+
+    def __map(self, words):
+        '''Run a command over many argument sets in parallel.
+
+           - map [-j jobs] [-u] <command> [args] ::: <arg> <arg> ...
+           - map [-j jobs] [-u] -a <file> <command> [args]
+           - {} in command is replaced by each argument (a word, quoted
+             or not, or a whole line of file), quoted as needed
+        '''
+        try:
+            matches, tokens = self.__map_flags.parse_tokens(list(words), interspersed=False)
+        except FlagError as e:
+            _error.set(str(e))
+            print("Error: {}".format(e))
+            return
+
+        if (':::' in tokens):
+            split = tokens.index(':::')
+            argsets = tokens[split+1:]
+            tokens = tokens[:split]
+        elif (matches.get('a')):
+            try:
+                with open(matches['a']) as f:
+                    argsets = [l.strip() for l in f if l.strip()]
+            except OSError as e:
+                _error.set(str(e))
+                print("Error: {}".format(e))
+                return
+        else:
+            argsets = []
+
+        if (not tokens or not argsets):
+            _error.set("nothing to map")
+            print("Error: usage: map [-j jobs] [-u] <command> [args] ::: <args> ... (or -a file)")
+            return
+
+        failed = 0
+        results = self.fan_out(tokens, argsets, matches.get('j') or 4, 'u' not in matches)
+        for result in results:
+            print(result.output, end="")
+            if (result.error):
+                failed += 1
+                print("Error: [{}] {}".format(result.line, result.error))
+
+        if (failed):
+            _error.set("{} of {} tasks failed".format(failed, len(argsets)))
+            print("{} of {} tasks failed.".format(failed, len(argsets)))
 
 
-    def __bash(self, command, args, flags, bash_string):
+    def __manage_cache(self, args):
+        '''cache: show hit/miss stats of cacheable commands,
+        cache clear [command]: drop cached results.
+        '''
+        if (args and args[0] == "clear"):
+            command = args[1] if len(args) > 1 else None
+            if (command and command not in self.commands):
+                _error.set("no command {}".format(command))
+                print("Error: no command {}.".format(command))
+                return
+            print("Dropped {} cached results.".format(self.invalidate_cache(command)))
+            return
+
+        if (args):
+            _error.set("invalid cache arguments")
+            print("Error: usage: cache [clear [command]]")
+            return
+
+        stats = self.result_cache.stats()
+        cacheable = sorted(c for c, record in self.__dispatch.items() if record.cache is not None)
+        print("cacheable:  {}".format(', '.join(cacheable) or "none"))
+        print("entries:    {} ({} chars)".format(stats["entries"], stats["bytes"]))
+        print("hits:       {} ({:.0%})".format(stats["hits"], stats["hit_rate"]))
+        print("misses:     {}".format(stats["misses"]))
+        print("evictions:  {}".format(stats["evictions"]))
+
+        parses = self.__parse.cache_info()
+        print("parsed:     {} lines cached, {} hits, {} misses".format(parses.currsize, parses.hits,
+                                                                      parses.misses))
+
+
+    def __show_stats(self, args):
+        '''stats: show per phase timings, stats on|off: start/stop
+        recording, stats reset: clear timings, stats json [file]:
+        export timings as JSON (to file if given).
+        '''
+        stats = self.phase_stats
+        action = args[0] if args else ''
+
+        if (action == "on" or action == "off"):
+            stats.enabled = (action == "on")
+            print("Recording {}.".format(action))
+        elif (action == "reset"):
+            stats.reset()
+        elif (action == "json"):
+            exported = json.dumps(stats.summary(), indent=2)
+            if (len(args) > 1):
+                try:
+                    with open(args[1], 'w') as f:
+                        f.write(exported + '\n')
+                except OSError as e:
+                    _error.set(str(e))
+                    print("Error: {}".format(e))
+            else:
+                print(exported)
+        elif (not action):
+            if (not stats.enabled):
+                print("Recording off, stats on to start.")
+            print(stats.table())
+        else:
+            _error.set("invalid stats arguments")
+            print("Error: usage: stats [on|off|reset|json [file]]")
+
+
+    def __profile(self, words):
+        '''Evaluate line under cProfile and print its top functions by
+        cumulative time.
+
+           - profile [-n count] [-c] <line>
+           - -c also shows callers of the functions shown
+        '''
+        try:
+            matches, tokens = self.__profile_flags.parse_tokens(list(words), interspersed=False)
+        except FlagError as e:
+            _error.set(str(e))
+            print("Error: {}".format(e))
+            return
+
+        if (not tokens):
+            _error.set("nothing to profile")
+            print("Error: usage: profile [-n count] [-c] <line>")
+            return
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            self.__evaluate(join_words(tokens))
+        finally:
+            profiler.disable()
+
+            count = matches.get('n') or 15
+            report = pstats.Stats(profiler, stream=sys.stdout)
+            report.sort_stats("cumulative").print_stats(count)
+            if ('c' in matches):
+                report.print_callers(count)
+
+
+    def __watch(self, words):
+        '''Re-run command every few seconds, redrawing only the lines of
+        its output that changed.
+
+           - watch [-n secs] [-c count] <command>
+           - stops on any key, Ctrl-C (or kill, as a job) or after
+             count runs
+           - identical output is not redrawn; cacheable commands show
+             new output once their cached result expires
+           - if output is not a terminal, each changed output is
+             printed whole
+        '''
+        try:
+            matches, tokens = self.__watch_flags.parse_tokens(list(words), interspersed=False)
+        except FlagError as e:
+            _error.set(str(e))
+            print("Error: {}".format(e))
+            return
+
+        if (not tokens):
+            _error.set("nothing to watch")
+            print("Error: usage: watch [-n secs] [-c count] <command>")
+            return
+
+        watched = join_words(tokens)
+        parsed = self.__parse(watched)
+        if (parsed.error or not parsed.stages[0].record):
+            error = parsed.error or "cannot watch {}, not a command".format(parsed.command)
+            _error.set(error)
+            print("Error: {}".format(error))
+            return
+
+        interval = matches['n'] if matches.get('n') is not None else self.watch_interval
+        if (interval <= 0):
+            _error.set("interval must be positive")
+            print("Error: interval must be positive")
+            return
+        count = matches.get('c')
+        if (count is not None and count <= 0):
+            _error.set("count must be positive")
+            print("Error: count must be positive")
+            return
+
+        console = current_stdout()
+        frames = FrameRenderer(console)
+        header = "Every {:g}s: {}".format(interval, watched)
+        if (frames.cursor):
+            header = Styler.style(header, Styler.BOLD)
+
+        # Ctrl-C in async_main_loop stops the watch through its job
+        job = _job.get()
+        stop = threading.Event()
+        if (job): job.stop = stop
+
+        runs = 0
+        try:
+            with _cbreak(frames.cursor and sys.stdin.isatty()) as fd:
+                if (frames.cursor): console.write(Cursor.HIDE)
+                while (True):
+                    with redirect(Capture(console)) as out:
+                        self.__run_parsed(parsed, watched, to_file=True)
+                    frames.draw([header, ''] + out.getvalue().splitlines())
+
+                    runs += 1
+                    if (runs == count or _wait_for_key(fd, interval, stop)):
+                        break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if (frames.cursor):
+                console.write(Cursor.SHOW)
+                console.flush()
+            if (job): job.stop = None
+
+
+    def __run_task(self, line):
+        '''Evaluate line, capturing its output and error (fan_out task).
+        '''
+        with redirect(StringIO()) as out:
+            try:
+                self.__evaluate(line)
+                error = _error.get()
+            except Exception as e:
+                error = "{}: {}".format(e.__class__.__name__, e)
+
+        return TaskResult(line, out.getvalue(), error)
+
+
+    def __bash(self, record, args, flags, bash_string, pipe=None):
         '''Execute bash command from output of given subclass command.
+
+           - output is streamed line by line into stdin of the bash
+             command, never held in memory or put on its command line
+           - if bash command stops reading (e.g. head), subclass
+             command is stopped
+           - bash stdout and stderr go to the console, or are copied
+             to the stream output is redirected to (e.g. a remote
+             session, background job or map task)
+           - return exit status of bash command
         '''
-        out_string = self.__get_stdout(command, args, flags)
-        bash_args = ["echo", "'{}'".format(out_string), "|"]
-        for s in bash_string.split():
-            bash_args.append(s.strip())
-        stdout = subprocess.run(' '.join(bash_args), shell=True)
+        out = current_stdout()
+        captured = out is not sys.__stdout__
 
+        proc = subprocess.Popen(bash_string.strip(), shell=True, stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE if captured else None,
+                                stderr=subprocess.STDOUT if captured else None,
+                                universal_newlines=True, bufsize=1)
+        if (captured):
+            copier = threading.Thread(target=_copy_lines, args=(proc.stdout, out), daemon=True)
+            copier.start()
 
-    def __get_stdout(self, command, args, flags):
+        try:
+            with redirect(proc.stdin):
+                self.__exec_command(record, args, flags, pipe)
+        except BrokenPipeError:
+            # bash command closed its input early
+            pass
+        finally:
+            # bash command is reaped however the subclass command ended
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+            status = proc.wait()
+            if (captured):
+                copier.join()
+
+        if (status):
+            _error.set("shell command exited with status {}".format(status))
+
+        return status
+
+
+    def __stream(self, record, args, flags, pipe=None):
+        '''Run streaming (generator) command, teeing each chunk to the
+        console and -f file as it is produced.
+        '''
+        streams = []
+        if ('s' not in self.flag_input):
+            streams.append(current_stdout())
+
+        if (self.__sink):
+            streams.append(self.__sink)
+
+        try:
+            with redirect(Tee(streams)):
+                self.__exec_command(record, args, flags, pipe)
+        finally:
+            if (self.__sink): self.__sink.end_command()
+
+
+    def __get_stdout(self, record, args, flags, pipe=None):
         '''Run command and return output printed to console.
+
+           - output only counts as going to a terminal if it is not
+             also written to the -f file
         '''
-        bu = sys.stdout
-        sys.stdout = StringIO()
-        self.__exec_command(command, args, flags)
-        out = sys.stdout.getvalue()
-        sys.stdout.close()
-        sys.stdout = bu
+        console = None if (self.__sink or 's' in self.flag_input) else current_stdout()
+        with redirect(Capture(console)) as out:
+            self.__exec_command(record, args, flags, pipe)
+            return out.getvalue()
+
+    @classmethod
+    def __build_registry(cls):
+        '''Discover commands and completers defined on class.
+
+           - defined commands are of pattern "ore_<command>"
+           - completer methods are of pattern "completer_<command>"
+           - class dicts are read directly (subclass definitions
+             override base ones), no attributes are evaluated
+        '''
+        functions = {}
+        for klass in reversed(cls.__mro__):
+            for name, value in vars(klass).items():
+                if (name.startswith("ore_") or name.startswith("completer_")):
+                    if (inspect.isfunction(value)):
+                        functions[name] = value
+                    else:
+                        functions.pop(name, None)
 
-        return out
+        groups = OrderedDict(cls.groups)
 
-    def __get_flags(self, command):
-        '''Given a command, return its defined flags.
+        commands = {}
+        completers = {}
+        for name in sorted(functions):
+            if (name.startswith("ore_")):
+                commands[name[4:]] = cls.__build_command(name[4:], functions[name], groups)
+            else:
+                completers[name[10:]] = functions[name]
+
+        ## plugin commands, unless defined as ore_* methods; broken
+        ## manifests and commands are skipped with a warning, so the
+        ## app still imports
+        errors = []
+        plugins = []
+        for manifest in cls.plugins:
+            try:
+                plugins += load_manifest(manifest)
+            except PluginError as e:
+                errors.append(str(e))
+        plugins = merge_commands(plugins, entry_point_commands(cls.plugin_group)
+                                          if cls.plugin_group else [], errors)
+        for error in errors:
+            print("WARNING: {}: plugin skipped, {}.".format(cls.__name__, error), file=sys.stderr)
+
+        for plugin in plugins:
+            if (plugin.name in commands):
+                continue
+
+            if (plugin.group and plugin.group != "Miscellaneous"):
+                groups.setdefault(plugin.group, [])
+                if (plugin.name not in groups[plugin.group]):
+                    groups[plugin.group] = list(groups[plugin.group]) + [plugin.name]
+
+            commands[plugin.name] = cls.__build_plugin_command(plugin, groups)
+            if (plugin.completer):
+                completers[plugin.name] = cls.__build_plugin_completer(plugin)
+
+        ## index of names for suggestions, built on the first lookup
+        suggestions = None
+        if (cls.suggest_distance):
+            suggestions = SuggestionIndex(list(commands) + list(_BUILTINS), cls.suggest_distance)
+
+        groups = MappingProxyType(OrderedDict((g, tuple(c)) for g, c in groups.items()))
+        return Registry(MappingProxyType(commands), MappingProxyType(completers), groups,
+                        suggestions)
+
+
+    @classmethod
+    def __build_command(cls, command, f, groups, flags=None, group=None):
+        '''Given a command, build its dispatch record.
 
-           - if no flags defined, return empty typle ()
+           - check if ore_* method takes in args, flags
+           - compile defined flags (flags_<command>) unless flags given,
+             resolve BYPASS marker and group (unless given)
+           - check if ore_* method is a generator
+           - resolve CACHE marker (or orecache.cached) ttl
+           - check if ore_* method takes a pipe
         '''
-        try:
-            flags = getattr(self, 'flags_'+command)
-        except AttributeError:
-            flags = []
-        
-        return flags
+        params = inspect.getfullargspec(f).args
+        if ('args' in params and 'flags' in params):
+            convention = "both"
+        elif ('args' in params):
+            convention = "args"
+        elif ('flags' in params):
+            convention = "flags"
+        else:
+            convention = "none"
+
+        bypass = "BYPASS" in (f.__doc__ or '')
+
+        if (not group):
+            group = "Miscellaneous"
+            for g in groups:
+                if command in groups[g]:
+                    group = g
+                    break
+
+        if (flags is None):
+            flags = FlagSet(getattr(cls, 'flags_'+command, []))
+
+        return Command(command, f, convention, flags, bypass, group, inspect.isgeneratorfunction(f),
+                       cache_ttl(f, cls.cache_ttl), 'pipe' in params, None,
+                       isolate_timeout(f, cls.isolate_timeout))
+
+
+    @classmethod
+    def __build_plugin_command(cls, plugin, groups):
+        '''Build placeholder dispatch record of a plugin command from its
+        manifest, without importing it.
+
+           - replaced by the record of the imported function on first
+             use (see __load_plugin)
+           - its function imports the command when called directly
+             (e.g. through Ore.commands), docstring is that of the
+             manifest
+        '''
+        def command(self, *args, **kwargs):
+            return self.__load_plugin(plugin.name).f(self, *args, **kwargs)
+        command.__name__ = "ore_" + plugin.name
+        command.__doc__ = plugin.doc
+
+        group = plugin.group
+        if (not group):
+            group = "Miscellaneous"
+            for g in groups:
+                if plugin.name in groups[g]:
+                    group = g
+                    break
+
+        isolate = cls.isolate_timeout if plugin.isolate is True else plugin.isolate
+
+        return Command(plugin.name, command, "both", FlagSet(plugin.flags), False, group, False, None,
+                       False, plugin, isolate)
+
+
+    @classmethod
+    def __build_plugin_completer(cls, plugin):
+        '''Build completer of a plugin command, importing the plugin
+        completer on first Tab.
+        '''
+        loaded = []
+        def complete(self, text, line, begidx, endidx):
+            if (not loaded):
+                loaded.append(resolve(plugin.completer))
+            return loaded[0](self, text, line, begidx, endidx)
+        complete.__doc__ = "BACKGROUND" if plugin.background else None
 
+        return complete
 
-    def __exec_command(self, command, args, flags):
-        '''Given a command, execute desired ore_* method.
+
+    def __load_plugin(self, command):
+        '''Import plugin command, replacing its placeholder dispatch
+        record with one built from the imported function.
+
+           - return dispatch record of command
+           - whether it runs isolated is declared by its manifest (so
+             worker processes are set up before it is imported)
+           - imported commands are shared with sessions of this instance
+           - raise PluginError if it cannot be imported
+        '''
+        record = self.__dispatch[command]
+        if (not record.plugin):
+            return record
+
+        f = resolve(record.plugin.target)
+        isolate = record.isolate
+        record = self.__build_command(command, f, self.groups, record.flags, record.group)
+        record = record._replace(isolate=isolate)
+        self.__dispatch[command] = record
+        return record
+
+
+    def __exec_command(self, record, args, flags, pipe=None):
+        '''Given a dispatch record, execute desired ore_* method.
 
            - find and execute and flag functions if defined
-           - check if ore_* method takes in args, flags
-           - pass args, flags if method takes parameters
+           - pass args, flags, pipe if method takes parameters
+           - await async commands
+           - print chunks of streaming commands as they are yielded
+           - replay output of cacheable commands from the result cache
+             (unless reading a pipe or isolated)
         '''
+        stats = self.phase_stats
+        timed = stats.enabled
+        if (timed): mark = stats.clock()
+
         ## search for, execute flag functions
-        def_flags = self.__get_flags(command)
-        if (def_flags):
-            for df in def_flags:
-                if (df.name in flags):
-                    self.__exec_flag_func(df, flags[df.name])
+        self.__exec_flag_funcs(record, flags)
+
+        if (timed): mark = stats.add("flags", mark)
+
+        if (record.cache is not None and pipe is None and record.isolate is None):
+            self.__exec_cached(record, args, flags)
+        else:
+            self.__call_command(record, args, flags, pipe)
 
+        if (timed): stats.add("command", mark)
+
+    def __exec_cached(self, record, args, flags):
+        '''Replay cached output of command call, or call it and cache
+        its output if it completes.
+        '''
+        # styled and plain output are cached apart
+        key = ResultCache.key(record.name, args, flags) + (sys.stdout.isatty(),)
+        output = self.result_cache.get(key)
+        if (output is not None):
+            sys.stdout.write(output)
+            return
+
+        # output still goes out as produced (streaming, pipes)
+        out = current_stdout()
+        captured = Capture(out)
+        with redirect(Tee([out, captured])):
+            self.__call_command(record, args, flags)
+
+        self.result_cache.put(key, captured.getvalue(), record.cache)
+
+    def __call_command(self, record, args, flags, pipe=None):
+        '''Call ore_* method, printing chunks of streaming commands.
+        '''
+        result = self.__invoke(record, args, flags, pipe)
+
+        if (record.streaming):
+            write = sys.stdout.write
+            for chunk in result:
+                write("{}\n".format(chunk))
+
+    def __invoke(self, record, args, flags, pipe=None):
+        '''Call ore_* method by its convention, return its result.
+
+           - pipe is passed by keyword to methods taking it (None if
+             not reading a pipe)
+           - async methods are run to completion
+           - isolated commands run in a worker process (see
+             __run_isolated)
+        '''
+        if (record.isolate is not None and not self.__in_worker):
+            items = self.__run_isolated(record, args, flags, pipe)
+            if (record.streaming):
+                return items
+            for item in items:
+                pass
+            return None
 
         ## execute command method
-        params = inspect.getfullargspec(self.commands[command]).args
-        if ('args' in params and 'flags' in params):
-            self.commands[command](args, flags)
-        elif ('args' in params):
-            self.commands[command](args)
-        elif ('flags' in params):
-            self.commands[command](flags)
+        convention = record.convention
+        if (record.piped):
+            call_args = {"both": (args, flags), "args": (args,), "flags": (flags,)}.get(convention, ())
+            result = record.f(self, *call_args, pipe=pipe)
+        elif (convention == "both"):
+            result = record.f(self, args, flags)
+        elif (convention == "args"):
+            result = record.f(self, args)
+        elif (convention == "flags"):
+            result = record.f(self, flags)
         else:
-            self.commands[command]()
+            result = record.f(self)
+
+        if (inspect.iscoroutine(result)):
+            result = self.__run_coroutine(result)
+
+        return result
+
+    def __exec_flag_funcs(self, record, flags):
+        '''Execute flag functions of matched flags of command.
+
+           - those of isolated commands run in the worker process
+        '''
+        if (record.isolate is not None and not self.__in_worker):
+            return
+
+        for df in record.flags:
+            if (df.name in flags):
+                self.__exec_flag_func(df, flags[df.name])
+
+
+    def __run_isolated(self, record, args, flags, pipe=None):
+        '''Run isolated command in a worker process, writing its printed
+        output to stdout as it arrives; yield objects it yields
+        (streaming commands).
+
+           - a pipe is read whole and sent to the worker
+           - timeout, Ctrl-C (or kill, as a job), a crash of the worker
+             or an exception raised by the command end the run with an
+             error; the session keeps running
+           - attributes set by the command stay in the worker
+        '''
+        # Ctrl-C in async_main_loop cancels the run through its job
+        job = _job.get()
+        cancel = threading.Event()
+        if (job):
+            previous = job.stop
+            cancel = previous or cancel
+            job.stop = cancel
+
+        try:
+            request = (record.name, args, flags, None if pipe is None else list(pipe),
+                       sys.stdout.isatty())
+            write = sys.stdout.write
+            for kind, value in self.__get_pool().run(request, record.isolate, cancel):
+                if (kind == "out"):
+                    write(value)
+                else:
+                    yield value
+            return
+        except KeyboardInterrupt:
+            error = "cancelled"
+        except WorkerError as e:
+            error = str(e)
+        finally:
+            if (job): job.stop = previous
+
+        error = "{}: {}".format(record.name, error)
+        _error.set(error)
+        print("Error: {}".format(error))
+
+
+    def __serve_isolated(self, request, output):
+        '''Run isolated command in a worker process (WorkerPool
+        handler).
+        '''
+        name, args, flags, pipe, tty = request
+        record = self.__load_plugin(name)
+        output.tty = tty
+
+        # output of flag functions goes back with that of the command
+        with redirect(output):
+            self.__exec_flag_funcs(record, flags)
+            result = self.__invoke(record, args, flags, None if pipe is None else iter(pipe))
+            if (record.streaming):
+                for item in result:
+                    output.send("item", item)
+
+
+    def __init_worker(self):
+        '''Set up worker process state (forked from its template).
+        '''
+        self.__in_worker = True
+        self.__loop = None
+        self.__pool = None
+        self.__sink = None
+
+
+    def __get_pool(self):
+        '''Return worker pool of isolated commands, forking its workers
+        on first use.
+        '''
+        if (not self.__pool):
+            raise WorkerError("no worker pool, Ore.__init__ was not run")
+        self.__pool.start()
+        return self.__pool
+
+
+    def __start_template(self):
+        '''Start worker pool of isolated commands by forking its template
+        process, if there are isolated commands (plugin commands as
+        declared by their manifest).
+
+           - workers are forked from the template, so they start with
+             a copy of this instance as it was when Ore.__init__ ran
+             this, before any thread was started
+        '''
+        if (self.__in_worker or not any(record.isolate is not None
+                                        for record in self.__dispatch.values())):
+            return
+
+        self.__pool = WorkerPool(self.__serve_isolated, self.isolate_workers, self.__init_worker)
+        self.__pool.start(workers=False)
+        atexit.register(self.__pool.close)
+
+
+    def __start_workers(self):
+        '''Fork workers ahead of the first isolated command, if there are
+        isolated commands.
+        '''
+        if (self.__pool and any(record.isolate is not None
+                                for record in self.__dispatch.values())):
+            self.__pool.start()
+
 
     def __exec_flag_func(self, flag, arg):
         '''Take in a flag and an optional arg, and execute 
@@ -404,17 +1933,81 @@ class Ore(object):
                 flag.f()
 
 
-    def __get_group_from_command(self, command):
-        '''Find group that command is a member of.
+    def __get_class_docs(self, save=True):
+        '''Return class docs section, rendered on first use.
         '''
-        for g in self.groups:
-            if command in self.groups[g]:
-                return g
+        return self.__get_doc_section('', self.__render_class_docs, save)
 
-        return "Miscellaneous"
 
+    def __get_command_docs(self, command, save=True):
+        '''Return docs section of command, rendered on first use.
+        '''
+        return self.__get_doc_section(command, lambda: self.__render_command_docs(command), save)
 
-    def __get_class_docs(self):
+
+    def __get_doc_section(self, name, render, save):
+        '''Return rendered doc section from doc cache, rendering and
+        adding it (and saving the cache to disk if save) if missing.
+        '''
+        sections = self.__load_doc_cache()["sections"]
+        if (name not in sections):
+            sections[name] = render()
+            if (save): self.__save_doc_cache()
+
+        return sections[name]
+
+
+    def __load_doc_cache(self):
+        '''Load doc cache, from disk if saved with matching key.
+
+           - key is a hash of class/command docstrings and flags, any
+             change to them discards the saved docs
+        '''
+        if (self.__doc_cache is None):
+            key = self.__get_doc_key()
+            self.__doc_cache = {"key": key, "sections": {}}
+
+            if (self.docs_cache):
+                try:
+                    with open(self.__docs_path) as f:
+                        cached = json.load(f)
+                    if (cached.get("key") == key):
+                        self.__doc_cache = cached
+                except (OSError, ValueError):
+                    pass
+
+        return self.__doc_cache
+
+
+    def __save_doc_cache(self):
+        '''Write doc cache to disk (atomically replacing old cache).
+        '''
+        if (not self.docs_cache): return
+
+        tmp = "{}.{}".format(self.__docs_path, os.getpid())
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self.__doc_cache, f)
+            os.replace(tmp, self.__docs_path)
+        except OSError:
+            pass
+
+
+    def __get_doc_key(self):
+        '''Hash everything docs are rendered from.
+        '''
+        flag_info = lambda flags: [(f.usage, f.description) for f in flags]
+
+        source = [self.__class__.__name__, self.__doc__, sys.argv[0],
+                  flag_info(self.__flags), flag_info(self.flags)]
+        for command in sorted(self.commands):
+            record = self.__dispatch[command]
+            source.append([command, self.commands[command].__doc__, flag_info(record.flags)])
+
+        return hashlib.sha1(json.dumps(source).encode()).hexdigest()
+
+
+    def __render_class_docs(self):
         # class name
         # insert __flags usage into USAGE statement
         
@@ -449,7 +2042,7 @@ class Ore(object):
         return '\n'.join(docs)
 
 
-    def __get_command_docs(self, command):
+    def __render_command_docs(self, command):
         # docstring (usage, description, examples)
         # get flags (description)
         
@@ -461,7 +2054,7 @@ class Ore(object):
             docs.append(parsed["DESCRIPTION"])
         if (parsed["USAGE"]):
             docs.append("**USAGE:** *{}*\n".format(parsed["USAGE"][6:].lstrip()))
-        flag_info = self.__get_flag_info(self.__get_flags(command))
+        flag_info = self.__get_flag_info(self.__dispatch[command].flags)
         
         if (flag_info):
             docs.append("**Flags**\n")
@@ -500,7 +2093,7 @@ class Ore(object):
                 parsed["USAGE"] = line
             elif (line.startswith("EXAMPLE:")):
                 examples.append("```\n{}\n```".format(line[8:].lstrip()))
-            elif (line.startswith("BYPASS")):
+            elif (line.startswith("BYPASS") or line.startswith("CACHE") or line.startswith("ISOLATE")):
                 continue;
             else:
                 description.append(line)
@@ -509,3 +2102,176 @@ class Ore(object):
         parsed["DESCRIPTION"] = '\n'.join(description)
 
         return parsed
+
+
+# Ore's own registry, subclasses build theirs in __init_subclass__
+Ore._Ore__registry = Ore._Ore__build_registry()
+
+
+def _copy_flags(flags):
+    '''Copy matched flags (and lists of repeated flags).
+    '''
+    if (not flags): return {}
+    return {name: list(v) if isinstance(v, list) else v for name, v in flags.items()}
+
+
+def _fill(line, args):
+    '''Return line of a task of Ore.fan_out: line (string or sequence of
+    words) with {} replaced by args, or args appended, args quoted.
+    '''
+    if (isinstance(line, str)):
+        if ('{}' in line):
+            return line.replace('{}', join_words(args))
+        return "{} {}".format(line, join_words(args))
+
+    if (any('{}' in w for w in line)):
+        return join_words([w.replace('{}', ' '.join(args)) for w in line])
+    return join_words(list(line) + list(args))
+
+
+@contextlib.contextmanager
+def _cbreak(enabled):
+    '''Put stdin in cbreak mode while in context (keys can be read as
+    pressed, Ctrl-C still interrupts), yield its file descriptor or None
+    if not enabled.
+    '''
+    if (not enabled):
+        yield None
+        return
+
+    fd = sys.stdin.fileno()
+    saved = termios.tcgetattr(fd)
+    try:
+        tty.setcbreak(fd)
+        yield fd
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+
+
+def _wait_for_key(fd, timeout, stop):
+    '''Wait up to timeout seconds, return True if a key was pressed on
+    fd (if not None) or stop was set.
+    '''
+    if (fd is None):
+        return stop.wait(timeout)
+
+    deadline = time.monotonic() + timeout
+    while (not stop.is_set()):
+        left = deadline - time.monotonic()
+        if (left <= 0):
+            return False
+        # short waits, so stop is seen while no key is pressed
+        if (select.select([fd], [], [], min(left, 0.1))[0]):
+            os.read(fd, 1024)
+            return True
+    return True
+
+
+async def _redirected(coro, stream):
+    '''Await coro with its output redirected to stream.
+    '''
+    with redirect(stream):
+        return await coro
+
+
+def _copy_lines(source, stream):
+    '''Copy lines of source to stream until end of file.
+    '''
+    with source:
+        for line in source:
+            stream.write(line)
+
+
+class Job(object):
+    '''Line evaluated in a worker thread by Ore.async_main_loop;
+    number 0 is the foreground command.
+    '''
+
+    def __init__(self, number, line):
+        self.number = number
+        self.line = line
+        self.output = StringIO()
+        self.reported = False
+
+        # asyncio future of evaluation, concurrent future of the async
+        # command currently running on the event loop (if any)
+        self.future = None
+        self.coroutine = None
+        self.killed = False
+
+        # set to stop the watch built-in, if job is running one
+        self.stop = None
+
+    def kill(self):
+        '''Cancel running async command or watch, False if neither is
+        running.
+        '''
+        if (self.stop):
+            self.killed = True
+            self.stop.set()
+            return True
+
+        coroutine = self.coroutine
+        if (not coroutine): return False
+
+        self.killed = True
+        coroutine.cancel()
+        return True
+
+    def status(self):
+        if (not self.future.done()):
+            return "Running"
+        if (self.killed or self.future.cancelled()):
+            return "Killed"
+
+        e = self.future.exception()
+        if (isinstance(e, (futures.CancelledError, asyncio.CancelledError))):
+            return "Killed"
+        if (e):
+            return "Failed"
+        return "Done"
+
+
+class BatchReport(object):
+    '''Per-line status and throughput of a batch run (Ore.run_lines).
+    '''
+    OK = "ok"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+    QUIT = "quit"
+
+    def __init__(self):
+        self.statuses = []
+        self.failures = []
+        self.executed = 0
+        self.failed = 0
+        self.elapsed = 0.0
+        self.__start = time.perf_counter()
+
+    def add(self, lineno, line, status, message=""):
+        '''Record status of a line.
+        '''
+        self.statuses.append(status)
+        if (status == self.SKIPPED): return
+
+        self.executed += 1
+        if (status == self.FAILED):
+            self.failed += 1
+            self.failures.append((lineno, line, message))
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.__start
+
+    def rate(self):
+        '''Executed lines per second.
+        '''
+        return self.executed / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        '''Format failed lines and throughput.
+        '''
+        lines = ["line {}: {} ({})".format(n, message, line) for n, line, message in self.failures]
+        lines.append("{} lines: {} ok, {} failed in {:.3f}s ({:.0f} lines/s)".format(
+            self.executed, self.executed - self.failed, self.failed, self.elapsed, self.rate()))
+
+        return '\n'.join(lines)
@@ -0,0 +1,124 @@
+import time, threading
+from collections import OrderedDict
+
+
+def cached(ttl=None):
+    '''Decorator marking an ore_* command as cacheable, same as a
+    "CACHE [ttl]" line in its docstring.
+
+       - ttl: seconds a result stays valid (None for Ore.cache_ttl)
+    '''
+    def mark(f):
+        f.ore_cache_ttl = ttl
+        return f
+    return mark
+
+
+def cache_ttl(f, default):
+    '''Return ttl of cacheable command function f, None if f is not
+    cacheable.
+
+       - decorator (cached) takes precedence over docstring marker
+    '''
+    if (hasattr(f, "ore_cache_ttl")):
+        return default if f.ore_cache_ttl is None else f.ore_cache_ttl
+
+    for line in (f.__doc__ or '').split('\n'):
+        words = line.split()
+        if (words and words[0] == "CACHE"):
+            try:
+                return float(words[1]) if len(words) > 1 else default
+            except ValueError:
+                return default
+
+    return None
+
+
+class ResultCache(object):
+    '''Captured output of cacheable commands, keyed by command, args and
+    matched flags.
+
+       - LRU eviction once max_entries results or max_bytes characters
+         of output are held
+       - results expire ttl seconds after being stored
+       - safe to share between threads (sessions, jobs, map tasks)
+    '''
+
+    def __init__(self, max_entries=256, max_bytes=16*1024*1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @staticmethod
+    def key(command, args, flags):
+        '''Build cache key of a command call.
+        '''
+        matched = tuple(sorted((name, tuple(v) if isinstance(v, list) else v)
+                               for name, v in flags.items()))
+        return (command, tuple(args), matched)
+
+    def get(self, key):
+        '''Return cached output of key, None if missing or expired.
+        '''
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if (entry is None or entry[0] < time.monotonic()):
+                if (entry is not None):
+                    self.__remove(key)
+                self.misses += 1
+                return None
+
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, output, ttl):
+        '''Store output of key for ttl seconds.
+        '''
+        if (len(output) > self.max_bytes): return
+
+        with self.__lock:
+            if (key in self.__entries):
+                self.__remove(key)
+
+            self.__entries[key] = (time.monotonic() + ttl, output)
+            self.size += len(output)
+
+            while (len(self.__entries) > self.max_entries or self.size > self.max_bytes):
+                self.__remove(next(iter(self.__entries)))
+                self.evictions += 1
+
+    def invalidate(self, command=None):
+        '''Drop cached results, only those of command if given.
+
+           - return number of results dropped
+        '''
+        with self.__lock:
+            keys = [k for k in self.__entries if command in (None, k[0])]
+            for key in keys:
+                self.__remove(key)
+
+        return len(keys)
+
+    def stats(self):
+        '''Return dict of hit/miss counts and cache usage.
+        '''
+        with self.__lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self.__entries), "bytes": self.size,
+                    "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0,
+                    "evictions": self.evictions}
+
+    def __remove(self, key):
+        self.size -= len(self.__entries.pop(key)[1])
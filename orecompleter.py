@@ -1,39 +1,109 @@
-import readline
+import readline, threading, time, inspect, asyncio
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent import futures
 
 class OreCompleter(object):
     '''Completer class to be used with readline autocompletion.
 
        - main completer matches against commands defined in subclass
-       - support for definition of command 'subcompleters' defined in 
+       - support for definition of command 'subcompleters' defined in
          the subclass to complete options relative to a specific
          command
+       - options are kept sorted and matched by bisection
+       - subcompleter results are cached per (command, line prefix)
+         for ttl seconds with LRU eviction; invalidate() to drop stale
+         results sooner
+       - slow subcompleters can be set to run in the background
+         (see BackgroundCompleter)
     '''
-    
-    command_options = {}
 
-    def __init__(self, options):
+    def __init__(self, options, cache_size=128, ttl=5.0):
         self.options = sorted(options)
+        self.command_options = {}
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.matches = []
+
+        self.__option_set = set(self.options)
+        self.__cache = OrderedDict()
 
     def complete(self, text, state):
         if (state == 0):
             # get options: either command names or from completers
             # defined in subclass
-            options = self.__get_options(text)
-            if (text):
-                self.matches = [m for m in options if m.startswith(text)]
-            else:
-                # if no text, then return everything
-                self.matches = options
+            self.matches = self.__get_options(text)
 
         try:
             return self.matches[state]
         except IndexError:
             return None
 
-    def set_command_completer(self, command, completer):
+    def complete_line(self, text, line, begidx, endidx):
+        '''Return all matches of text at line[begidx:endidx], for callers
+        completing without readline (e.g. remote sessions).
+        '''
+        command = self.__get_command(line)
+
+        if (not command):
+            matches = prefix_matches(self.options, text)
+            # command word typed, warm up its background completer
+            if (len(matches) == 1):
+                self.prefetch(matches[0])
+            return matches
+
+        if (command not in self.command_options):
+            # no completer method defined - return empty list
+            return []
+
+        # subclass has completer defined for command
+        # return options from cached or executed completer method
+        f = self.command_options[command]
+        if (isinstance(f, BackgroundCompleter)):
+            # background completers keep their own cache
+            return prefix_matches(f(text, line, begidx, endidx), text)
+
+        return self.__get_command_options(command, text, line, begidx, endidx)
+
+    def command_matches(self, text):
+        '''Return defined commands starting with text.
+        '''
+        return prefix_matches(self.options, text)
+
+    def set_command_completer(self, command, completer, background=False, budget=0.05, refresh=30.0):
         '''Set completer function for command defined in subclass.
+
+           - if background, completer is run in a worker thread and
+             given at most budget seconds per Tab press
         '''
+        if (background):
+            completer = BackgroundCompleter(completer, budget, refresh)
+
         self.command_options[command] = completer
+        self.invalidate(command)
+
+    def prefetch(self, command):
+        '''Start fetching candidates of a background completer.
+        '''
+        f = self.command_options.get(command)
+        if (isinstance(f, BackgroundCompleter)):
+            f.prefetch(command + ' ')
+
+    def invalidate(self, command=None):
+        '''Drop cached subcompleter results.
+
+           - if command given, only drop results for that command
+        '''
+        for c, f in self.command_options.items():
+            if (isinstance(f, BackgroundCompleter) and command in (None, c)):
+                f.invalidate()
+
+        if (command is None):
+            self.__cache.clear()
+            return
+
+        for key in [k for k in self.__cache if k[0] == command]:
+            del self.__cache[key]
 
     def __get_command(self, line):
         '''Check if beginning of line represents defined command.
@@ -41,11 +111,11 @@ class OreCompleter(object):
            - if no command found, return empty string
         '''
         check = line.split(' ', 1)
-        command = check[0] if check[0] in self.options else ""
+        command = check[0] if check[0] in self.__option_set else ""
         return command
 
     def __get_options(self, text):
-        '''Return options to match against in complete()
+        '''Return options matching text for complete()
 
            - if command found, return options from subclass
              defined completer methods
@@ -53,24 +123,380 @@ class OreCompleter(object):
            - if command found but no subclass defined completer,
              return empty list
         '''
-        options = self.options
-       
-        ## check if subclass completer has been set for command if command defined
         # grab info from readline to pass to subclass defined completers
-        line = readline.get_line_buffer()
-        begidx = readline.get_begidx()
-        endidx = readline.get_endidx()
+        return self.complete_line(text, readline.get_line_buffer(),
+                                  readline.get_begidx(), readline.get_endidx())
 
-        command = self.__get_command(line)
-        if (command):
-            if (command in self.command_options):
-                # subclass has completer defined for command
-                # return options from executed completer method
-                f = self.command_options[command]
-                options = f(text, line, begidx, endidx)
-            else:
-                # no completer method defined - return empty list
-                options = []
+    def __get_command_options(self, command, text, line, begidx, endidx):
+        '''Return sorted options of subclass completer, cached by
+        (command, line before text, text) for ttl seconds.
+
+           - results cached for a shorter text are narrowed instead of
+             calling the completer again, completers are expected to
+             return a superset of the options for a longer text
+           - unless text extends one of those options (e.g. a directory
+             "dir/" completed further as "dir/f"): the completer may
+             return options below it, so it is called again
+        '''
+        prefix = line[:begidx]
+
+        options = self.__cached((command, prefix, text))
+        if (options is not None):
+            return options
+
+        for i in range(len(text) - 1, -1, -1):
+            shorter = self.__cached((command, prefix, text[:i]))
+            if (shorter is not None):
+                if (not _has_prefix_of(shorter, text, i)):
+                    options = prefix_matches(shorter, text)
+                break
+
+        if (options is None):
+            f = self.command_options[command]
+            options = prefix_matches(sorted(f(text, line, begidx, endidx)), text)
+
+        self.__cache[(command, prefix, text)] = (time.monotonic(), options)
+        if (len(self.__cache) > self.cache_size):
+            self.__cache.popitem(last=False)
 
         return options
 
+    def __cached(self, key):
+        '''Return cached options of key, None if missing or expired.
+        '''
+        cached = self.__cache.get(key)
+        if (cached is None):
+            return None
+
+        if (time.monotonic() - cached[0] >= self.ttl):
+            del self.__cache[key]
+            return None
+
+        self.__cache.move_to_end(key)
+        return cached[1]
+
+
+class BackgroundCompleter(object):
+    '''Subcompleter run in a worker thread, time bounded per Tab press.
+
+       - candidates are fetched per line prefix with an empty text and
+         matched locally, so completer must return every candidate
+         when text is empty
+       - a call waits at most budget seconds for a running fetch, then
+         returns cached candidates (empty if none fetched yet)
+       - cached candidates older than refresh seconds are refetched in
+         the background
+       - completer may be an async function
+    '''
+    __executor = None
+    __executor_lock = threading.Lock()
+
+    def __init__(self, f, budget=0.05, refresh=30.0, cache_size=32):
+        self.f = f
+        self.budget = budget
+        self.refresh = refresh
+        self.cache_size = cache_size
+
+        self.__cache = OrderedDict()
+        self.__pending = {}
+        self.__lock = threading.Lock()
+
+    def __call__(self, text, line, begidx, endidx):
+        prefix = line[:begidx]
+        future = self.prefetch(prefix)
+        if (future):
+            futures.wait([future], timeout=self.budget)
+
+        with self.__lock:
+            cached = self.__cache.get(prefix)
+
+        return cached[1] if cached else []
+
+    def prefetch(self, prefix):
+        '''Fetch candidates for line prefix in the background.
+
+           - return future of running fetch, None if cache is fresh
+        '''
+        with self.__lock:
+            future = self.__pending.get(prefix)
+            if (future):
+                return future
+
+            cached = self.__cache.get(prefix)
+            if (cached and time.monotonic() - cached[0] < self.refresh):
+                return None
+
+            future = self.__get_executor().submit(self.__fetch, prefix)
+            self.__pending[prefix] = future
+            return future
+
+    def invalidate(self):
+        '''Drop cached candidates.
+        '''
+        with self.__lock:
+            self.__cache.clear()
+
+    def __fetch(self, prefix):
+        try:
+            result = self.f('', prefix, len(prefix), len(prefix))
+            if (inspect.isawaitable(result)):
+                result = asyncio.run(result)
+            options = sorted(result)
+        finally:
+            with self.__lock:
+                del self.__pending[prefix]
+
+        with self.__lock:
+            self.__cache[prefix] = (time.monotonic(), options)
+            self.__cache.move_to_end(prefix)
+            if (len(self.__cache) > self.cache_size):
+                self.__cache.popitem(last=False)
+
+    @classmethod
+    def __get_executor(cls):
+        with cls.__executor_lock:
+            if (not cls.__executor):
+                cls.__executor = futures.ThreadPoolExecutor(max_workers=2,
+                                                            thread_name_prefix="ore-completer")
+            return cls.__executor
+
+
+def prefix_matches(options, text):
+    '''Given sorted options, return those starting with text.
+    '''
+    if (not text):
+        return list(options)
+
+    start = bisect_left(options, text)
+    end = bisect_left(options, text + '\U0010ffff', start)
+    return options[start:end]
+
+
+def _has_prefix_of(options, text, start):
+    '''Given sorted options, check if any of them is text[:j] for a j
+    of at least start.
+    '''
+    for j in range(start, len(text) + 1):
+        i = bisect_left(options, text[:j])
+        if (i < len(options) and options[i] == text[:j]):
+            return True
+    return False
+
+
+class SuggestionIndex(object):
+    '''Index of words for "did you mean" suggestions of misspelled
+    words (SymSpell style).
+
+       - every word is indexed under each string obtained by deleting
+         up to max_distance characters of its first prefix_length
+         characters, and likewise of its last ones; a lookup generates
+         the deletes of the misspelled word's prefix and suffix and
+         checks only the words found under both
+       - words are kept apart by length, so a lookup only meets words
+         within max_distance characters of its length
+       - suffixes keep lookups fast for names sharing long prefixes
+         (e.g. show_user, show_group)
+       - distance is the optimal string alignment distance: insertions,
+         deletions, substitutions and transpositions of adjacent
+         characters count one edit each
+       - the index is built on the first lookup (not when created, so
+         classes with many commands are created fast), in time and
+         memory linear in the number of words
+    '''
+
+    def __init__(self, words, max_distance=2, prefix_length=7):
+        self.max_distance = max_distance
+        self.prefix_length = max(prefix_length, max_distance + 1)
+        self.__words = set()
+        self.__prefixes = {}
+        self.__suffixes = {}
+        self.__pending = list(words)
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        self.__build()
+        return len(self.__words)
+
+    def __build(self):
+        if (self.__pending is None):
+            return
+        with self.__lock:
+            if (self.__pending is None):
+                return
+            # words often share prefixes and suffixes, and so deletes
+            deletes = {}
+            for word in self.__pending:
+                self.__add(word, deletes)
+            self.__pending = None
+
+    def add(self, word):
+        self.__build()
+        with self.__lock:
+            self.__add(word, {})
+
+    def __add(self, word, deletes):
+        if (word in self.__words):
+            return
+        self.__words.add(word)
+
+        n = self.prefix_length
+        for index, part in ((self.__prefixes, word[:n]), (self.__suffixes, word[-n:])):
+            index = index.setdefault(len(word), {})
+            if (part not in deletes):
+                deletes[part] = _deletes(part, self.max_distance)
+            for d in deletes[part]:
+                found = index.get(d)
+                if (found is None):
+                    index[d] = [word]
+                else:
+                    found.append(word)
+
+    def suggest(self, text, max_distance=None, limit=5):
+        '''Return list of (word, distance) of words within max_distance
+        edits of text (at most the index max_distance), closest first
+        then alphabetically; at most limit of them.
+        '''
+        if (max_distance is None or max_distance > self.max_distance):
+            max_distance = self.max_distance
+        if (not text):
+            return []
+        self.__build()
+
+        # words under the deletes of prefix and of suffix, the smaller
+        # side first; the other only narrows a large candidate set
+        n = self.prefix_length
+        lengths = range(len(text) - max_distance, len(text) + max_distance + 1)
+        sides = []
+        for index, part in ((self.__prefixes, text[:n]), (self.__suffixes, text[-n:])):
+            deletes = _deletes(part, max_distance)
+            buckets = []
+            for size in lengths:
+                found = index.get(size)
+                if (found):
+                    buckets.extend(found[d] for d in found.keys() & deletes)
+            sides.append((sum(len(b) for b in buckets), buckets))
+        sides.sort(key=lambda side: side[0])
+
+        candidates = set().union(*sides[0][1])
+        if (len(candidates) > 32):
+            candidates &= set().union(*sides[1][1])
+
+        matches = []
+        for word in candidates:
+            distance = edit_distance(text, word, max_distance)
+            if (distance <= max_distance):
+                matches.append((distance, word))
+
+        matches.sort()
+        return [(word, distance) for distance, word in matches[:limit]]
+
+
+def _deletes(word, distance):
+    '''Return set of word and strings made by deleting up to distance
+    characters of it.
+    '''
+    found = {word}
+    level = {word}
+    for i in range(distance):
+        level = {w[:j] + w[j+1:] for w in level for j in range(len(w))}
+        found |= level
+    return found
+
+
+def edit_distance(a, b, limit=None):
+    '''Return optimal string alignment distance of a and b.
+
+       - if limit given, return limit + 1 as soon as the distance is
+         known to exceed it; only cells within limit of the diagonal
+         are computed, and limits up to 2 only try the few ways an
+         edit at each end can make them equal
+    '''
+    if (a == b):
+        return 0
+    a, b = _trim(a, b)
+
+    n = len(a)
+    m = len(b)
+    if (limit is None):
+        limit = max(n, m)
+    over = limit + 1
+    if (abs(n - m) > limit):
+        return over
+    if (not n or not m):
+        return max(n, m)
+    if (limit <= 2):
+        return _near(a, b, limit)
+
+    before = None
+    previous = [j if j <= limit else over for j in range(m + 1)]
+    for i in range(1, n + 1):
+        row = [over] * (m + 1)
+        if (i <= limit):
+            row[0] = i
+        best = row[0]
+
+        x = a[i-1]
+        for j in range(max(1, i - limit), min(m, i + limit) + 1):
+            y = b[j-1]
+            d = previous[j-1] + (x != y)
+            if (previous[j] + 1 < d):
+                d = previous[j] + 1
+            if (row[j-1] + 1 < d):
+                d = row[j-1] + 1
+            # transposition of adjacent characters
+            if (i > 1 and j > 1 and x == b[j-2] and a[i-2] == y and before[j-2] + 1 < d):
+                d = before[j-2] + 1
+            row[j] = d
+            if (d < best):
+                best = d
+
+        if (best > limit):
+            return over
+        before, previous = previous, row
+
+    return min(previous[m], over)
+
+
+def _trim(a, b):
+    '''Return a and b without their common prefix and suffix, which
+    take no edits.
+    '''
+    n = min(len(a), len(b))
+    i = 0
+    while (i < n and a[i] == b[i]):
+        i += 1
+    j = 0
+    while (j < n - i and a[-1-j] == b[-1-j]):
+        j += 1
+    return a[i:len(a)-j], b[i:len(b)-j]
+
+
+def _near(a, b, limit):
+    '''Return edit_distance of trimmed, non-empty a and b, or limit + 1
+    if over limit (at most 2).
+
+       - their first characters differ and so do their last ones, so
+         one edit must fix the front and, unless it is the only one,
+         another the back, with all between them equal
+    '''
+    n = len(a)
+    m = len(b)
+    if (limit and n == m and (n == 1 or (n == 2 and a[0] == b[1] and a[1] == b[0]))):
+        return 1
+    if (limit < 2):
+        return limit + 1
+
+    # characters taken from a and b by a substitution, deletion,
+    # insertion or transposition
+    front = [(1, 1), (1, 0), (0, 1)]
+    back = [(1, 1), (1, 0), (0, 1)]
+    if (n > 1 and m > 1):
+        if (a[0] == b[1] and a[1] == b[0]):
+            front.append((2, 2))
+        if (a[-1] == b[-2] and a[-2] == b[-1]):
+            back.append((2, 2))
+    for i, j in front:
+        for k, l in back:
+            if (n - i - k == m - j - l >= 0 and a[i:n-k] == b[j:m-l]):
+                return 2
+    return 3
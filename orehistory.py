@@ -0,0 +1,380 @@
+import os, re, fcntl, threading, time, pickle, heapq, math
+from array import array
+from collections import deque
+
+
+class History(object):
+    '''Bounded command history file, safe to share between sessions.
+
+       - keeps at most max_length entries, in memory and on disk
+       - consecutive duplicate entries are dropped
+       - new entries are batched in memory and appended to the file
+         every flush_interval seconds (checked on add), once
+         flush_size entries are pending, and on close
+       - file is compacted to its last max_length entries in a
+         background thread once it grows to compact_factor times
+         its loaded size
+       - appends and compaction hold an exclusive lock on
+         <path>.lock so concurrent sessions never interleave writes
+       - compaction first catches up the HistoryIndex of the file, so
+         entries it drops stay searchable
+    '''
+
+    def __init__(self, path, max_length=10000, flush_interval=5.0, flush_size=100, compact_factor=2):
+        self.path = path
+        self.max_length = max_length
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.compact_factor = compact_factor
+
+        self.entries = deque(maxlen=max_length)
+
+        self.__pending = []
+        self.__last_flush = time.monotonic()
+        self.__compact_size = 0
+        self.__compactor = None
+        self.__lock_path = path + '.lock'
+
+    def load(self):
+        '''Read the last max_length entries of the history file.
+
+           - only the tail of the file is read
+           - return list of loaded entries
+        '''
+        entries, size = self.__read_tail()
+        self.entries.clear()
+        for e in entries:
+            self.add(e, persist=False)
+
+        # compact once file holds compact_factor times the wanted entries
+        self.__compact_size = max(size, 4096) * self.compact_factor
+
+        return list(self.entries)
+
+    def add(self, line, persist=True):
+        '''Add an entry, return False if dropped as a duplicate of the
+        last entry.
+        '''
+        line = line.replace('\n', ' ')
+        if (not line or (self.entries and self.entries[-1] == line)):
+            return False
+
+        self.entries.append(line)
+
+        if (persist):
+            self.__pending.append(line)
+            if (len(self.__pending) >= self.flush_size or
+                    time.monotonic() - self.__last_flush >= self.flush_interval):
+                self.flush()
+
+        return True
+
+    def flush(self):
+        '''Append pending entries to the history file.
+        '''
+        self.__last_flush = time.monotonic()
+        if (not self.__pending): return
+
+        data = ''.join(e + '\n' for e in self.__pending)
+        self.__pending = []
+
+        with self.__locked():
+            with open(self.path, 'a') as f:
+                f.write(data)
+                size = f.tell()
+
+        if (self.__compact_size and size > self.__compact_size):
+            self.compact(background=True)
+
+    def compact(self, background=False):
+        '''Rewrite history file with its last max_length entries.
+        '''
+        if (background):
+            if (self.__compactor and self.__compactor.is_alive()): return
+            self.__compactor = threading.Thread(target=self.compact, daemon=True)
+            self.__compactor.start()
+            return
+
+        with self.__locked():
+            index = HistoryIndex(self.path)
+            index.load()
+            index.update()
+            index.save()
+
+            entries, size = self.__read_tail()
+            tmp = "{}.{}".format(self.path, os.getpid())
+            with open(tmp, 'w') as f:
+                f.write(''.join(e + '\n' for e in entries))
+            os.replace(tmp, self.path)
+
+        self.__compact_size = max(size, 4096) * self.compact_factor
+
+    def close(self):
+        '''Flush pending entries and wait for a running compaction.
+        '''
+        self.flush()
+        if (self.__compactor):
+            self.__compactor.join()
+
+    def __locked(self):
+        return _FileLock(self.__lock_path)
+
+    def __read_tail(self):
+        '''Return (last max_length lines of file, their size in bytes).
+        '''
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return ([], 0)
+
+        with f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            data = b''
+            block = 65536
+            # read blocks backwards until enough lines are held
+            while (pos > 0 and data.count(b'\n') <= self.max_length):
+                step = min(block, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+
+        lines = data.decode(errors='replace').split('\n')
+        if (pos > 0):
+            # first line may be cut off
+            lines = lines[1:]
+        lines = [l for l in lines if l][-self.max_length:]
+
+        return (lines, sum(len(l) + 1 for l in lines))
+
+
+class _FileLock(object):
+    '''Exclusive advisory lock held on a lock file (context manager).
+    '''
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.__f = open(self.path, 'a')
+        fcntl.flock(self.__f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.__f, fcntl.LOCK_UN)
+        self.__f.close()
+
+
+class HistoryIndex(object):
+    '''Search index over every entry ever appended to a history file.
+
+       - persisted to <history path>.idx, maintained incrementally by
+         reading entries appended to the history file since last update
+         (survives compaction of the history file, which updates the
+         persisted index first)
+       - an update reloads the persisted index if another session (or
+         a compaction) saved it since this one was loaded or saved
+       - one entry per unique command with use count and last use,
+         results ranked by frequency and recency
+       - n-gram postings (characters, trigrams and leading characters)
+         narrow candidates of substring, prefix and fuzzy
+         (subsequence) searches
+    '''
+    VERSION = 1
+
+    def __init__(self, history_path, half_life=1000):
+        self.history_path = history_path
+        self.path = history_path + '.idx'
+        self.half_life = half_life
+
+        self.commands = []
+        self.counts = []
+        self.last = []
+        self.seq = 0
+
+        self.__ids = {}
+        self.__postings = {}
+        self.__inode = None
+        self.__offset = 0
+        self.__anchor = []
+        self.__dirty = False
+        self.__stamp = None
+
+    def load(self):
+        '''Load persisted index, if any.
+        '''
+        try:
+            with open(self.path, 'rb') as f:
+                self.__stamp = self.__stat(f.fileno())
+                state = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return
+
+        if (state.get("version") != self.VERSION): return
+
+        self.commands = state["commands"]
+        self.counts = state["counts"]
+        self.last = state["last"]
+        self.seq = state["seq"]
+        self.__postings = state["postings"]
+        self.__inode = state["inode"]
+        self.__offset = state["offset"]
+        self.__anchor = state["anchor"]
+        self.__ids = {c: i for i, c in enumerate(self.commands)}
+
+    def save(self):
+        '''Persist index if changed since load.
+        '''
+        if (not self.__dirty): return
+
+        state = {"version": self.VERSION, "commands": self.commands, "counts": self.counts,
+                 "last": self.last, "seq": self.seq, "postings": self.__postings,
+                 "inode": self.__inode, "offset": self.__offset, "anchor": self.__anchor}
+
+        tmp = "{}.{}".format(self.path, os.getpid())
+        with open(tmp, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            self.__stamp = self.__stat(f.fileno())
+        os.replace(tmp, self.path)
+        self.__dirty = False
+
+    def update(self):
+        '''Index entries appended to history file since last update.
+        '''
+        try:
+            if (self.__stat(self.path) != self.__stamp):
+                self.load()
+        except FileNotFoundError:
+            pass
+
+        try:
+            f = open(self.history_path, 'rb')
+        except FileNotFoundError:
+            return
+
+        with f:
+            st = os.fstat(f.fileno())
+            if (st.st_ino == self.__inode and st.st_size >= self.__offset):
+                if (st.st_size == self.__offset): return
+                f.seek(self.__offset)
+                start = self.__offset
+                data = f.read()
+                lines = data.split(b'\n')
+            else:
+                # history file was compacted: resume after the last
+                # entries indexed, if still present
+                start = 0
+                data = f.read()
+                lines = data.split(b'\n')
+                n = len(self.__anchor)
+                if (n):
+                    for i in range(len(lines) - 1, n - 1, -1):
+                        if (lines[i-n:i] == self.__anchor):
+                            lines = lines[i:]
+                            break
+
+        # last item is an incomplete line (or empty after final \n)
+        partial = lines.pop()
+        for line in lines:
+            if (line):
+                self.add(line.decode(errors='replace'))
+
+        self.__inode = st.st_ino
+        self.__offset = start + len(data) - len(partial)
+        self.__anchor = [l for l in lines if l][-5:] or self.__anchor
+        self.__dirty = True
+
+    def add(self, command):
+        '''Record a use of command.
+        '''
+        self.seq += 1
+        self.__dirty = True
+
+        i = self.__ids.get(command)
+        if (i is not None):
+            self.counts[i] += 1
+            self.last[i] = self.seq
+            return
+
+        i = len(self.commands)
+        self.__ids[command] = i
+        self.commands.append(command)
+        self.counts.append(1)
+        self.last.append(self.seq)
+
+        for gram in set(command) | self.__grams(command) | self.__starts(command):
+            postings = self.__postings.get(gram)
+            if (postings is None):
+                postings = self.__postings[gram] = array('I')
+            postings.append(i)
+
+    def search(self, query, mode="substring", limit=20):
+        '''Return up to limit commands matching query, best first.
+
+           - mode is "substring", "prefix" or "fuzzy" (query characters
+             appear in order)
+        '''
+        if (mode == "prefix"):
+            match = lambda c: c.startswith(query)
+            grams = self.__grams(query) | self.__starts(query)
+        elif (mode == "fuzzy"):
+            pattern = re.compile('.*?'.join(re.escape(ch) for ch in query))
+            match = lambda c: pattern.search(c) is not None
+            grams = set(query)
+        else:
+            match = lambda c: query in c
+            grams = self.__grams(query)
+
+        candidates = self.__candidates(grams)
+        commands = self.commands
+        found = [i for i in candidates if match(commands[i])]
+
+        # rank: use count, halved every half_life uses of other commands
+        # since last use
+        counts = self.counts
+        last = self.last
+        seq = self.seq
+        half_life = self.half_life
+        log = math.log
+        score = lambda i: (1 + log(counts[i])) * 0.5 ** ((seq - last[i]) / half_life)
+
+        return [commands[i] for i in heapq.nlargest(limit, found, key=score)]
+
+    def __candidates(self, grams):
+        '''Return ids holding all grams, from shortest postings list.
+        '''
+        if (not grams):
+            return range(len(self.commands))
+
+        shortest = None
+        for gram in grams:
+            postings = self.__postings.get(gram)
+            if (postings is None):
+                return ()
+            if (shortest is None or len(postings) < len(shortest)):
+                shortest = postings
+
+        return shortest
+
+    @staticmethod
+    def __stat(path):
+        '''Identity of an index file version (path or open fd).
+        '''
+        st = os.stat(path)
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    @staticmethod
+    def __grams(text):
+        '''Trigrams of text, its characters if too short for any.
+        '''
+        if (len(text) < 3):
+            return set(text)
+        return set(text[i:i+3] for i in range(len(text) - 2))
+
+    @staticmethod
+    def __starts(text):
+        '''Grams anchored to the start of text (first one and two
+        characters), for short prefix searches.
+        '''
+        return set('\0' + text[:i] for i in (1, 2) if len(text) >= i)
@@ -0,0 +1,265 @@
+import os, sys, time, gzip, shutil, queue, threading, contextvars
+from io import StringIO
+
+
+class Tee(object):
+    '''File-like object that writes through to several streams at once.
+
+       - used to stream command output to the console, the -f file
+         and pipes as it is produced
+    '''
+
+    def __init__(self, streams):
+        self.streams = list(streams)
+
+    def write(self, s):
+        for stream in self.streams:
+            stream.write(s)
+        return len(s)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        for stream in self.streams:
+            stream.flush()
+
+    def isatty(self):
+        # a terminal only if every stream is (e.g. not the -f file)
+        return bool(self.streams) and all(s.isatty() for s in self.streams)
+
+
+class Capture(StringIO):
+    '''StringIO capturing output that is later written to console.
+
+       - isatty() is that of console, so commands style their output
+         only if it ends up on a terminal
+    '''
+
+    def __init__(self, console=None):
+        super().__init__()
+        self.console = console
+
+    def isatty(self):
+        return self.console is not None and self.console.isatty()
+
+
+# stream output is redirected to in the current context (thread or
+# asyncio task), None for the process stdout
+_target = contextvars.ContextVar("ore_stdout", default=None)
+
+
+class ContextStdout(object):
+    '''sys.stdout replacement sending writes to the stream redirected
+    to in the current context (see redirect()), otherwise to the
+    stdout it replaced.
+    '''
+
+    def __init__(self, stdout):
+        self.stdout = stdout
+
+    def write(self, s):
+        target = _target.get()
+        return (target if target is not None else self.stdout).write(s)
+
+    def flush(self):
+        return current_stdout().flush()
+
+    def isatty(self):
+        return current_stdout().isatty()
+
+    def __getattr__(self, name):
+        return getattr(current_stdout(), name)
+
+
+def current_stdout():
+    '''Return stream output of current context is written to.
+    '''
+    target = _target.get()
+    if (target is not None):
+        return target
+    if (isinstance(sys.stdout, ContextStdout)):
+        return sys.stdout.stdout
+    return sys.stdout
+
+
+class redirect(object):
+    '''Redirect sys.stdout to stream in the current context only
+    (context manager).
+
+       - other threads and asyncio tasks keep writing to their own
+         streams, unlike replacing sys.stdout
+       - a thread started while redirected begins with an empty
+         context: it writes to the process stdout, escaping -s and -f
+         capture, unless started as a ContextThread
+       - installs ContextStdout as sys.stdout on first use
+    '''
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __enter__(self):
+        if (not isinstance(sys.stdout, ContextStdout)):
+            sys.stdout = ContextStdout(sys.stdout)
+
+        self.__token = _target.set(self.stream)
+        return self.stream
+
+    def __exit__(self, *exc):
+        _target.reset(self.__token)
+
+
+class ContextThread(threading.Thread):
+    '''Thread running in a copy of the context it was created in, so its
+    output goes where that of its creator is redirected (see redirect).
+
+       - use for threads started by ore_* commands
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__context = contextvars.copy_context()
+
+    def run(self):
+        self.__context.run(super().run)
+
+
+class FileSink(object):
+    '''Output file for the -f flag, opened once and written by a
+    background writer thread.
+
+       - write() only queues text; the writer thread encodes it into
+         a buffer of buffer_size bytes
+       - flush policy: "command" (after each command), "interval"
+         (every flush_interval seconds) or "exit" (on close only)
+       - if max_bytes set, file is rotated to path.1 .. path.<backups>
+         when it grows past max_bytes, rotated segments optionally
+         gzip compressed; if rotating fails, output goes on to path and
+         rotation is tried again after another max_bytes
+       - if the file cannot be written, write() raises the error
+    '''
+    __FLUSH = object()
+    __CLOSE = object()
+
+    def __init__(self, path, buffer_size=65536, flush="command", flush_interval=1.0,
+                 max_bytes=0, backups=5, compress=False):
+        if (flush not in ("command", "interval", "exit")):
+            raise ValueError("unknown flush policy ({})".format(flush))
+
+        self.path = path
+        self.buffer_size = buffer_size
+        self.policy = flush
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.compress = compress
+        self.error = None
+
+        self.__queue = queue.Queue()
+        self.__file = open(path, 'ab', buffering=buffer_size)
+        self.__size = self.__file.tell()
+        self.__closed = False
+
+        self.__writer = threading.Thread(target=self.__write_loop, daemon=True)
+        self.__writer.start()
+
+    def write(self, s):
+        if (self.error):
+            raise self.error
+        if (self.__closed):
+            raise ValueError("write to closed sink")
+
+        self.__queue.put(s)
+        return len(s)
+
+    def flush(self):
+        '''Queue a flush of buffered output to disk.
+        '''
+        self.__queue.put(self.__FLUSH)
+
+    def end_command(self):
+        '''Mark end of a command's output, flush if policy is "command".
+        '''
+        if (self.policy == "command"):
+            self.flush()
+
+    def isatty(self):
+        return False
+
+    def close(self):
+        '''Flush everything written so far and stop the writer thread.
+        '''
+        if (self.__closed): return
+        self.__closed = True
+
+        self.__queue.put(self.__CLOSE)
+        self.__writer.join()
+
+    def __write_loop(self):
+        interval = (self.policy == "interval")
+        due = time.monotonic() + self.flush_interval
+
+        while (True):
+            # with "interval", flush when due even if output never stops
+            timeout = max(due - time.monotonic(), 0) if interval else None
+            try:
+                item = self.__queue.get(timeout=timeout)
+            except queue.Empty:
+                item = self.__FLUSH
+
+            try:
+                if (item is self.__CLOSE):
+                    self.__file.close()
+                    return
+                elif (item is self.__FLUSH):
+                    self.__file.flush()
+                    due = time.monotonic() + self.flush_interval
+                elif (not self.error):
+                    data = item.encode()
+                    self.__file.write(data)
+                    self.__size += len(data)
+                    if (self.max_bytes and self.__size >= self.max_bytes):
+                        self.__rotate()
+
+                if (interval and time.monotonic() >= due):
+                    self.__file.flush()
+                    due = time.monotonic() + self.flush_interval
+            except (OSError, ValueError) as e:
+                self.error = e
+
+    def __rotate(self):
+        '''Move current file to path.1, shifting older segments up.
+
+           - on failure, path is reopened and written on
+        '''
+        self.__file.close()
+        try:
+            self.__shift_segments()
+        except OSError as e:
+            print("WARNING: cannot rotate {}: {}".format(self.path, e), file=sys.stderr)
+
+        self.__file = open(self.path, 'ab', buffering=self.buffer_size)
+        self.__size = 0
+
+    def __shift_segments(self):
+        '''Shift rotated segments up, move current file to path.1.
+        '''
+        suffix = ".gz" if self.compress else ""
+        segment = lambda i: "{}.{}{}".format(self.path, i, suffix)
+
+        if (self.backups):
+            if (os.path.exists(segment(self.backups))):
+                os.remove(segment(self.backups))
+            for i in range(self.backups - 1, 0, -1):
+                if (os.path.exists(segment(i))):
+                    os.replace(segment(i), segment(i + 1))
+
+            if (self.compress):
+                with open(self.path, 'rb') as src, gzip.open(segment(1), 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(self.path)
+            else:
+                os.replace(self.path, segment(1))
+        else:
+            os.remove(self.path)
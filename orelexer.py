@@ -0,0 +1,139 @@
+import re
+from collections import namedtuple
+
+
+class LexError(Exception):
+    '''Raised when a line cannot be split into words (unterminated
+    quote, redirect without a target).
+    '''
+
+
+# one |-separated segment of an input line
+#   - words: words of segment, quotes and escapes removed
+#   - text: raw text of segment, as typed (for shell commands)
+#   - redirect: (path, append) of a > or >> in segment, None if none
+Segment = namedtuple("Segment", ["words", "text", "redirect"])
+
+# characters that need more than str.split()
+_SPECIAL = re.compile(r'[\'"\\|>]')
+
+# run of ordinary word characters
+_PLAIN = re.compile(r'[^\s\'"\\|>]+')
+
+# first word of a segment, unquoted
+_NEXT_WORD = re.compile(r'\s*([^\s\'"\\|>]+)')
+
+# characters escaped by a backslash inside double quotes
+_DQ_ESCAPES = '"\\$`'
+
+
+def lex(line, is_command=None):
+    '''Split line into segments in a single pass.
+
+       - words are separated by whitespace
+       - '...' is literal, "..." allows \" and \\ escapes, a backslash
+         outside quotes escapes the next character
+       - | outside quotes separates segments
+       - > path or >> path outside quotes sets segment redirect
+       - if is_command given, the line from the first piped segment
+         whose first word it rejects on is a shell command, kept as
+         typed
+       - return tuple of (list of Segment, shell command or ""), raise
+         LexError if line is malformed
+    '''
+    if (not _SPECIAL.search(line)):
+        return ([Segment(tuple(line.split()), line, None)], "")
+
+    segments = []
+    words = []
+    word = []
+    in_word = False
+    redirect = None
+    pending = None   # append mode of a redirect waiting for its path
+    start = 0
+
+    i = 0
+    n = len(line)
+    while (True):
+        ch = line[i] if i < n else None
+
+        if (ch is None or ch.isspace() or ch == '|' or ch == '>'):
+            # end of word
+            if (in_word):
+                w = ''.join(word)
+                if (pending is not None):
+                    redirect = (w, pending)
+                    pending = None
+                else:
+                    words.append(w)
+                word = []
+                in_word = False
+
+            if (ch is None or ch == '|'):
+                # end of segment
+                if (pending is not None):
+                    raise LexError("missing file name after >")
+                segments.append(Segment(tuple(words), line[start:i], redirect))
+                if (ch is None):
+                    return (segments, "")
+                if (is_command):
+                    m = _NEXT_WORD.match(line, i + 1)
+                    if (not m or not is_command(m.group(1))):
+                        return (segments, line[i+1:])
+                words = []
+                redirect = None
+                start = i + 1
+            elif (ch == '>'):
+                if (pending is not None or redirect is not None):
+                    raise LexError("more than one redirect")
+                pending = (i + 1 < n and line[i+1] == '>')
+                if (pending): i += 1
+            i += 1
+
+        elif (ch == "'"):
+            end = line.find("'", i + 1)
+            if (end < 0):
+                raise LexError("unterminated quote")
+            word.append(line[i+1:end])
+            in_word = True
+            i = end + 1
+
+        elif (ch == '"'):
+            j = i + 1
+            while (j < n and line[j] != '"'):
+                if (line[j] == '\\' and j + 1 < n and line[j+1] in _DQ_ESCAPES):
+                    word.append(line[j+1])
+                    j += 2
+                else:
+                    word.append(line[j])
+                    j += 1
+            if (j >= n):
+                raise LexError("unterminated quote")
+            in_word = True
+            i = j + 1
+
+        elif (ch == '\\'):
+            if (i + 1 < n):
+                word.append(line[i+1])
+            in_word = True
+            i += 2
+
+        else:
+            m = _PLAIN.match(line, i)
+            word.append(m.group())
+            in_word = True
+            i = m.end()
+
+
+def quote(word):
+    '''Quote word so lex() reads it back as one word.
+    '''
+    if (word and not _SPECIAL.search(word) and not any(c.isspace() for c in word)):
+        return word
+    return "'" + word.replace("'", "'\\''") + "'"
+
+
+def join_words(words):
+    '''Join words into a line lex() splits back into the same words.
+    '''
+    return ' '.join(quote(w) for w in words)
@@ -0,0 +1,178 @@
+import json, importlib
+from collections import namedtuple
+
+from flag import Flag
+
+
+class PluginError(Exception):
+    '''Raised when a manifest is malformed or a plugin command cannot be
+    imported.
+    '''
+
+
+# command of a plugin, declared in a manifest or by an entry point
+#   - target: "module:function" of the command, imported on first use;
+#     the function takes the Ore instance first, like an ore_* method
+#   - doc: docstring (description, USAGE and EXAMPLE lines) used by
+#     help before the module is imported
+#   - group: group name, None to look it up in Ore.groups
+#   - flags: list of Flag
+#   - completer: "module:function" of its completer, None if none;
+#     background if it runs in the background (see OreCompleter)
+#   - isolate: None if the command runs in process, True to run it in a
+#     worker process with the default timeout, or its timeout (seconds)
+PluginCommand = namedtuple("PluginCommand", ["name", "target", "doc", "group", "flags",
+                                             "completer", "background", "isolate"])
+
+# flag argument types a manifest can name
+_TYPES = {"int": int, "float": float, "str": str}
+
+
+def load_manifest(source):
+    '''Return list of PluginCommand declared by a manifest, without
+    importing any plugin module.
+
+       - source is a dict or the path of a JSON file:
+
+           {"plugins": [{"module": "diskplugin", "group": "Disk",
+                         "commands": {"df": {"doc": "Show disk usage.",
+                                             "usage": "df [-h] [path]",
+                                             "examples": ["df -h /"],
+                                             "flags": [["h", "Human readable sizes."],
+                                                       ["d", "Depth.", "depth", "int"]],
+                                             "function": "df",
+                                             "completer": "complete_df",
+                                             "isolate": 30}}}]}
+
+       - function defaults to ore_<command>, group to that of the
+         plugin; flags are [name, description, arg, type] (arg and type
+         optional) or dicts with those keys
+       - isolate is true or a timeout (seconds) for a command that runs
+         in a worker process (see orepool); it must be declared here,
+         ISOLATE markers of plugin functions are not read
+       - a plugin without module takes its commands from entry points
+         (see entry_point_commands)
+       - raise PluginError if manifest cannot be read or is malformed
+    '''
+    if (not isinstance(source, dict)):
+        try:
+            with open(source) as f:
+                source = json.load(f)
+        except (OSError, ValueError) as e:
+            raise PluginError("cannot read manifest {}: {}".format(source, e))
+
+    commands = []
+    try:
+        for plugin in source.get("plugins", []):
+            module = plugin.get("module")
+            for name, spec in plugin.get("commands", {}).items():
+                target = completer = None
+                if (module):
+                    target = "{}:{}".format(module, spec.get("function", "ore_" + name))
+                    if (spec.get("completer")):
+                        completer = "{}:{}".format(module, spec["completer"])
+
+                commands.append(PluginCommand(name, target, _build_doc(spec),
+                                              spec.get("group", plugin.get("group")),
+                                              [_build_flag(f) for f in spec.get("flags", [])],
+                                              completer, bool(spec.get("background")),
+                                              _build_isolate(spec.get("isolate"))))
+    except (AttributeError, TypeError, KeyError, ValueError) as e:
+        raise PluginError("malformed manifest: {}".format(e))
+
+    return commands
+
+
+def entry_point_commands(group):
+    '''Return list of PluginCommand of entry points in group (name:
+    command, value: "module:function"), without importing them.
+    '''
+    from importlib import metadata
+
+    entry_points = metadata.entry_points()
+    if (hasattr(entry_points, "select")):
+        entry_points = entry_points.select(group=group)
+    else:
+        entry_points = entry_points.get(group, [])
+
+    return [PluginCommand(ep.name, ep.value, None, None, [], None, False, None) for ep in entry_points]
+
+
+def merge_commands(declared, entry_points, errors=None):
+    '''Merge manifest commands with entry point commands.
+
+       - manifest commands without a module get the target of the
+         entry point of the same name
+       - entry points not declared in a manifest are added as is
+       - if a manifest command has no target, raise PluginError, or if
+         errors (list) given, append the message and skip the command
+    '''
+    targets = {c.name: c for c in entry_points}
+
+    merged = []
+    for c in declared:
+        if (not c.target):
+            ep = targets.get(c.name)
+            if (not ep):
+                error = "no module or entry point for plugin command {}".format(c.name)
+                if (errors is None):
+                    raise PluginError(error)
+                errors.append(error)
+                continue
+            c = c._replace(target=ep.target)
+        merged.append(c)
+
+    names = set(c.name for c in merged)
+    merged += [c for c in entry_points if c.name not in names]
+
+    return merged
+
+
+def resolve(target):
+    '''Import module of "module:function" target, return the function.
+
+       - raise PluginError if it cannot be imported or found
+    '''
+    module, _, name = target.partition(':')
+    try:
+        f = importlib.import_module(module)
+        for attr in name.split('.'):
+            f = getattr(f, attr)
+    except (ImportError, AttributeError) as e:
+        raise PluginError("cannot load {}: {}".format(target, e))
+
+    return f
+
+
+def _build_doc(spec):
+    '''Docstring of a manifest command, in the format ore_* docstrings
+    are parsed in.
+    '''
+    lines = [spec.get("doc", "")]
+    if (spec.get("usage")):
+        lines.append("USAGE: " + spec["usage"])
+    lines += ["EXAMPLE: " + e for e in spec.get("examples", [])]
+    return '\n'.join(lines)
+
+
+def _build_isolate(spec):
+    if (spec is None or spec is False):
+        return None
+    if (spec is True):
+        return True
+    if (isinstance(spec, (int, float)) and spec > 0):
+        return float(spec)
+    raise ValueError("isolate must be true or a positive timeout ({})".format(spec))
+
+
+def _build_flag(spec):
+    if (isinstance(spec, dict)):
+        name, description = spec["name"], spec.get("description", "")
+        arg, type = spec.get("arg", ""), spec.get("type")
+    else:
+        name, description, arg, type = (list(spec) + [None, None])[:4]
+
+    if (type is not None and type not in _TYPES):
+        raise ValueError("unknown flag type {}".format(type))
+
+    return Flag(name, description, arg or "", type=_TYPES.get(type))
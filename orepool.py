@@ -0,0 +1,395 @@
+import os, time, signal, pickle, threading
+from multiprocessing import Pipe
+from multiprocessing.connection import Connection
+from multiprocessing.reduction import send_handle, recv_handle
+
+
+def isolated(timeout=None):
+    '''Decorator marking an ore_* command to run in a worker process,
+    same as an "ISOLATE [timeout]" line in its docstring.
+
+       - timeout: seconds a run may take (None for Ore.isolate_timeout)
+    '''
+    def mark(f):
+        f.ore_isolate_timeout = timeout
+        return f
+    return mark
+
+
+def isolate_timeout(f, default):
+    '''Return timeout of isolated command function f, None if f does
+    not run isolated.
+
+       - decorator (isolated) takes precedence over docstring marker
+    '''
+    if (hasattr(f, "ore_isolate_timeout")):
+        return default if f.ore_isolate_timeout is None else f.ore_isolate_timeout
+
+    for line in (f.__doc__ or '').split('\n'):
+        words = line.split()
+        if (words and words[0] == "ISOLATE"):
+            try:
+                return float(words[1]) if len(words) > 1 else default
+            except ValueError:
+                return default
+
+    return None
+
+
+class WorkerError(Exception):
+    '''Raised when a request fails in a worker: it raised, timed out,
+    was cancelled or the worker died.
+    '''
+
+
+class WorkerOutput(object):
+    '''Output stream of a worker process, sending what is written back
+    to the pool.
+
+       - text is sent once CHUNK characters are buffered, else within
+         interval seconds of being written
+       - isatty() is tty, that of the output in the calling process
+    '''
+    CHUNK = 8192
+
+    def __init__(self, conn, interval=0.05):
+        self.conn = conn
+        self.interval = interval
+        self.tty = False
+
+        self.__buffer = []
+        self.__size = 0
+        self.__lock = threading.Lock()
+
+        threading.Thread(target=self.__flush_loop, daemon=True).start()
+
+    def write(self, s):
+        with self.__lock:
+            self.__buffer.append(s)
+            self.__size += len(s)
+            if (self.__size >= self.CHUNK):
+                self.__flush()
+        return len(s)
+
+    def flush(self):
+        with self.__lock:
+            self.__flush()
+
+    def isatty(self):
+        return self.tty
+
+    def send(self, kind, value):
+        '''Send a message, after text written before it.
+        '''
+        with self.__lock:
+            self.__flush()
+            self.conn.send((kind, value))
+
+    def __flush(self):
+        if (self.__buffer):
+            self.conn.send(("out", ''.join(self.__buffer)))
+            self.__buffer = []
+            self.__size = 0
+
+    def __flush_loop(self):
+        try:
+            while (True):
+                time.sleep(self.interval)
+                self.flush()
+        except (OSError, EOFError):
+            # pool is gone
+            os._exit(0)
+
+
+class _Worker(object):
+
+    def __init__(self, pid, conn):
+        self.pid = pid
+        self.conn = conn
+
+
+class WorkerPool(object):
+    '''Pool of pre-forked worker processes running requests apart from
+    the calling process.
+
+       - start() forks a template process, workers are forked from it
+         (never from the calling process, whose other threads may hold
+         locks a forked child would never see released)
+       - each worker starts with a copy of the state of the calling
+         process when start() was first called: call it before any
+         thread is started
+       - handler(request, output) runs a request in a worker: text
+         written to output (WorkerOutput) and messages sent with
+         output.send(kind, value) are streamed back
+       - a worker that times out, is cancelled or dies is killed and
+         replaced by a newly forked one, so the pool stays warm
+       - safe to share between threads, requests wait for an idle
+         worker when all are busy
+    '''
+
+    def __init__(self, handler, size=2, initializer=None):
+        self.handler = handler
+        self.size = size
+        self.initializer = initializer
+
+        self.__idle = []
+        self.__workers = set()
+        self.__cond = threading.Condition()
+        self.__closed = False
+
+        # template process workers are forked from, and its pipe
+        self.__template = None
+        self.__template_pid = None
+        self.__template_lock = threading.Lock()
+
+    def start(self, workers=True):
+        '''Fork template process (first call only), then workers up to
+        size unless workers is False.
+        '''
+        with self.__cond:
+            if (self.__closed):
+                raise WorkerError("worker pool is closed")
+            if (not self.__template):
+                self.__fork_template()
+            while (workers and len(self.__workers) < self.size):
+                self.__idle.append(self.__fork())
+
+    def run(self, request, timeout=None, cancel=None):
+        '''Run request in a worker, yield (kind, value) messages it sends
+        back ("out" for text written to output).
+
+           - raise WorkerError if handler raises (message is exception
+             class and message), after timeout seconds, when cancel
+             (threading.Event) is set or if the worker dies
+           - closing the generator early (or KeyboardInterrupt) kills
+             the worker
+        '''
+        worker = self.__acquire(cancel)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        healthy = False
+        try:
+            try:
+                worker.conn.send(request)
+            except (pickle.PicklingError, TypeError, AttributeError) as e:
+                # request is pickled before anything is sent, the
+                # worker never saw it
+                healthy = True
+                raise WorkerError("cannot send request: {}".format(e))
+
+            while (True):
+                wait = None if deadline is None else deadline - time.monotonic()
+                if (wait is not None and wait <= 0):
+                    raise WorkerError("timed out after {:g}s".format(timeout))
+                if (cancel is not None):
+                    # short waits, so cancel is seen
+                    wait = 0.1 if wait is None else min(wait, 0.1)
+                    if (cancel.is_set()):
+                        raise WorkerError("cancelled")
+
+                if (not worker.conn.poll(wait)):
+                    continue
+
+                try:
+                    kind, value = worker.conn.recv()
+                except (EOFError, OSError):
+                    raise WorkerError(self.__exit_status(worker))
+
+                if (kind == "done"):
+                    healthy = True
+                    return
+                if (kind == "error"):
+                    healthy = True
+                    raise WorkerError(value)
+                yield (kind, value)
+        finally:
+            if (healthy):
+                self.__release(worker)
+            else:
+                self.__replace(worker)
+
+    def close(self):
+        '''Stop all workers, safe to call more than once.
+        '''
+        with self.__cond:
+            self.__closed = True
+            workers = list(self.__workers)
+            self.__workers.clear()
+            self.__idle = []
+            self.__cond.notify_all()
+
+        for worker in workers:
+            self.__kill(worker)
+
+        # template exits once its pipe is closed
+        with self.__template_lock:
+            if (self.__template):
+                self.__template.close()
+                self.__template = None
+                try:
+                    os.waitpid(self.__template_pid, 0)
+                except ChildProcessError:
+                    pass
+
+    def __acquire(self, cancel=None):
+        with self.__cond:
+            while (True):
+                if (self.__closed):
+                    raise WorkerError("worker pool is closed")
+                if (self.__idle):
+                    return self.__idle.pop()
+                if (len(self.__workers) < self.size):
+                    return self.__fork()
+                if (cancel is not None and cancel.is_set()):
+                    raise WorkerError("cancelled")
+                self.__cond.wait(0.1)
+
+    def __release(self, worker):
+        with self.__cond:
+            if (worker in self.__workers):
+                self.__idle.append(worker)
+                self.__cond.notify()
+
+    def __replace(self, worker):
+        '''Kill worker, fork a new one in its place.
+        '''
+        self.__kill(worker)
+        with self.__cond:
+            if (worker not in self.__workers):
+                return
+            self.__workers.discard(worker)
+            if (not self.__closed):
+                self.__idle.append(self.__fork())
+                self.__cond.notify()
+
+    def __fork_template(self):
+        '''Fork the template process (called with lock held).
+        '''
+        conn, child = Pipe()
+        pid = os.fork()
+        if (pid == 0):
+            conn.close()
+            _serve_template(child, self.handler, self.initializer)
+
+        child.close()
+        self.__template = conn
+        self.__template_pid = pid
+
+    def __fork(self):
+        '''Fork a worker from the template (called with lock held).
+        '''
+        if (not self.__template):
+            raise WorkerError("worker pool is not started")
+
+        with self.__template_lock:
+            try:
+                self.__template.send(("fork", None))
+                pid = self.__template.recv()
+                conn = Connection(recv_handle(self.__template))
+            except (EOFError, OSError) as e:
+                raise WorkerError("cannot fork worker: {}".format(e))
+
+        worker = _Worker(pid, conn)
+        self.__workers.add(worker)
+        return worker
+
+    def __kill(self, worker):
+        try:
+            os.kill(worker.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        worker.conn.close()
+        self.__wait(worker)
+
+    def __exit_status(self, worker):
+        status = self.__wait(worker)
+        if (status is None):
+            return "worker exited"
+
+        if (os.WIFSIGNALED(status)):
+            return "worker killed by signal {}".format(os.WTERMSIG(status))
+        return "worker exited with status {}".format(os.WEXITSTATUS(status))
+
+    def __wait(self, worker):
+        '''Have the template reap worker, return its exit status (None
+        if unknown).
+        '''
+        with self.__template_lock:
+            if (not self.__template):
+                return None
+            try:
+                self.__template.send(("wait", worker.pid))
+                return self.__template.recv()
+            except (EOFError, OSError):
+                return None
+
+
+def _serve_template(conn, handler, initializer):
+    '''Main loop of the template process: fork workers and reap them
+    on request of the pool until it closes its pipe. Never returns.
+
+       - ("fork", None): fork a worker, reply its pid then send the
+         pool end of its pipe
+       - ("wait", pid): wait for worker pid, reply its exit status
+    '''
+    status = 0
+    try:
+        # Ctrl-C reaches the whole process group, the pool decides
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+        while (True):
+            try:
+                request, pid = conn.recv()
+            except (EOFError, OSError):
+                break
+
+            if (request == "fork"):
+                worker, child = Pipe()
+                pid = os.fork()
+                if (pid == 0):
+                    conn.close()
+                    worker.close()
+                    _serve(child, handler, initializer)
+
+                child.close()
+                conn.send(pid)
+                send_handle(conn, worker.fileno(), os.getppid())
+                worker.close()
+            else:
+                try:
+                    conn.send(os.waitpid(pid, 0)[1])
+                except ChildProcessError:
+                    conn.send(None)
+    except BaseException:
+        status = 1
+    finally:
+        os._exit(status)
+
+
+def _serve(conn, handler, initializer):
+    '''Main loop of a worker process: run requests until the pool
+    closes its pipe. Never returns.
+    '''
+    status = 0
+    try:
+        # Ctrl-C reaches the whole process group, the pool decides
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        if (initializer):
+            initializer()
+
+        output = WorkerOutput(conn)
+        while (True):
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                break
+
+            try:
+                handler(request, output)
+                message = ("done", None)
+            except BaseException as e:
+                message = ("error", "{}: {}".format(e.__class__.__name__, e))
+            output.send(*message)
+    except BaseException:
+        status = 1
+    finally:
+        os._exit(status)
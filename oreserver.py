@@ -0,0 +1,286 @@
+'''Serve an Ore instance to many clients over a Unix socket.
+
+USAGE: python3 oreserver.py [socket path] [flags]
+
+The server side is started with Ore.serve(). Each connected client gets
+its own session (see Ore.new_session) of the one resident instance.
+
+Protocol: one JSON object per line, each way.
+    client: {"op": "open", "argv": [...]}
+    server: {"op": "ready", "intro": ..., "prompt": ...}
+    client: {"op": "line", "line": ...}
+    server: {"op": "out", "data": ...} (any number), then
+            {"op": "done", "running": ..., "error": ..., "prompt": ...}
+    client: {"op": "complete", "text": ..., "line": ..., "begidx": ..., "endidx": ...}
+    server: {"op": "matches", "matches": [...]}
+'''
+import os, sys, json, socket, socketserver, threading, readline
+
+from oreio import redirect
+
+
+class OreServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    '''Threaded Unix socket server of sessions of one Ore instance.
+
+       - one thread per connected client, commands of different
+         sessions run concurrently
+       - socket file is only accessible by its owner, removed on
+         server_close()
+       - a stale socket file (no server listening) is replaced
+    '''
+    daemon_threads = True
+
+    def __init__(self, ore, path):
+        self.ore = ore
+        self.path = path
+
+        # completer caches are not thread safe
+        self.complete_lock = threading.Lock()
+
+        if (os.path.exists(path)):
+            if (_listening(path)):
+                raise OSError("already serving on {}".format(path))
+            os.unlink(path)
+
+        super().__init__(path, SessionHandler)
+        os.chmod(path, 0o600)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class SessionHandler(socketserver.StreamRequestHandler):
+    '''Serve requests of one client connection (one session).
+    '''
+
+    def handle(self):
+        self.session = None
+        try:
+            for message in self.rfile:
+                request = json.loads(message)
+                op = request.get("op")
+
+                if (op == "open" and not self.session):
+                    self.session = self.server.ore.new_session(request.get("argv", []))
+                    self.send({"op": "ready", "intro": self.session.intro,
+                               "prompt": self.session.prompt})
+                elif (op == "line" and self.session):
+                    if (not self.run_line(request.get("line", ""))): break
+                elif (op == "complete" and self.session):
+                    self.complete(request)
+                else:
+                    self.send({"op": "error", "error": "unexpected request: {}".format(op)})
+        except (OSError, ValueError):
+            # client went away or sent garbage, drop session
+            pass
+        finally:
+            if (self.session):
+                self.session.close()
+
+    def run_line(self, line):
+        '''Execute line in session, streaming its output to the client.
+
+           - return False if session quit
+        '''
+        session = self.session
+        output = SessionOutput(self.send)
+
+        with redirect(output):
+            if (line):
+                running, error = session.execute(line)
+                session.history.add(line)
+            else:
+                running, error = True, None
+                try:
+                    session.emptyline()
+                except Exception as e:
+                    error = "{}: {}".format(e.__class__.__name__, e)
+        output.flush()
+
+        self.send({"op": "done", "running": running, "error": error, "prompt": session.prompt})
+        return running
+
+    def complete(self, request):
+        with self.server.complete_lock:
+            matches = self.session.completer.complete_line(request.get("text", ""),
+                                                           request.get("line", ""),
+                                                           request.get("begidx", 0),
+                                                           request.get("endidx", 0))
+        self.send({"op": "matches", "matches": list(matches)})
+
+    def send(self, message):
+        self.wfile.write(json.dumps(message).encode() + b'\n')
+        self.wfile.flush()
+
+
+class SessionOutput(object):
+    '''File-like object sending output of a session to its client.
+
+       - writes are batched into messages of up to buffer_size
+         characters, flush() sends the rest
+    '''
+
+    def __init__(self, send, buffer_size=8192):
+        self.send = send
+        self.buffer_size = buffer_size
+
+        self.__buffer = []
+        self.__size = 0
+
+    def write(self, s):
+        self.__buffer.append(s)
+        self.__size += len(s)
+        if (self.__size >= self.buffer_size):
+            self.flush()
+        return len(s)
+
+    def flush(self):
+        if (not self.__buffer): return
+
+        data = ''.join(self.__buffer)
+        self.__buffer = []
+        self.__size = 0
+        self.send({"op": "out", "data": data})
+
+    def isatty(self):
+        return False
+
+
+class OreClient(object):
+    '''Client of a session served by OreServer.
+    '''
+
+    def __init__(self, path, argv=()):
+        self.path = path
+
+        self.__sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.__sock.connect(path)
+        self.__rfile = self.__sock.makefile('rb')
+        self.__wfile = self.__sock.makefile('wb')
+
+        ready = self.__request({"op": "open", "argv": list(argv)})
+        self.intro = ready.get("intro")
+        self.prompt = ready.get("prompt")
+
+    def execute(self, line, out=None):
+        '''Execute line in session, writing its output to out (stdout
+        if None) as it arrives.
+
+           - return tuple of (keep running, error message or None)
+        '''
+        self.__send({"op": "line", "line": line})
+
+        while (True):
+            message = self.__receive()
+            if (message["op"] == "out"):
+                (out or sys.stdout).write(message["data"])
+            elif (message["op"] == "done"):
+                self.prompt = message["prompt"]
+                return (message["running"], message["error"])
+            else:
+                raise OSError(message.get("error", "unexpected reply"))
+
+    def complete_line(self, text, line, begidx, endidx):
+        '''Return matches of text at line[begidx:endidx] from the server.
+        '''
+        reply = self.__request({"op": "complete", "text": text, "line": line,
+                                "begidx": begidx, "endidx": endidx})
+        return reply["matches"]
+
+    def complete(self, text, state):
+        '''readline completer function.
+        '''
+        if (state == 0):
+            try:
+                self.__matches = self.complete_line(text, readline.get_line_buffer(),
+                                                    readline.get_begidx(), readline.get_endidx())
+            except OSError:
+                self.__matches = []
+
+        try:
+            return self.__matches[state]
+        except IndexError:
+            return None
+
+    def main_loop(self):
+        '''Read lines at the prompt and execute them remotely until the
+        session quits or input ends.
+        '''
+        readline.set_completer(self.complete)
+        readline.parse_and_bind("tab: complete")
+
+        print(self.intro)
+
+        while (True):
+            try:
+                line = input(self.prompt)
+            except EOFError:
+                print()
+                break
+
+            running = self.execute(line)[0]
+            sys.stdout.flush()
+            if (not running): break
+
+        self.close()
+
+    def close(self):
+        self.__rfile.close()
+        self.__wfile.close()
+        self.__sock.close()
+
+    def __request(self, message):
+        self.__send(message)
+        return self.__receive()
+
+    def __send(self, message):
+        self.__wfile.write(json.dumps(message).encode() + b'\n')
+        self.__wfile.flush()
+
+    def __receive(self):
+        line = self.__rfile.readline()
+        if (not line):
+            raise OSError("connection closed by server")
+        return json.loads(line)
+
+
+def _listening(path):
+    '''Check if a server accepts connections on socket path.
+    '''
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def main():
+    argv = sys.argv[1:]
+    if (argv and not argv[0].startswith('-')):
+        path = argv.pop(0)
+    else:
+        # default socket of the only served class, if one
+        sockets = [p for p in os.listdir(os.path.expanduser('~')) if p.startswith('.') and p.endswith('.sock')]
+        if (len(sockets) != 1):
+            print("Error: give socket path of server to connect to.")
+            sys.exit(1)
+        path = os.path.join(os.path.expanduser('~'), sockets[0])
+
+    try:
+        client = OreClient(path, argv)
+    except OSError as e:
+        print("Error: cannot connect to {}: {}".format(path, e))
+        sys.exit(1)
+
+    client.main_loop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import time, math, threading
+from collections import OrderedDict
+
+
+class Histogram(object):
+    '''Log bucketed histogram of durations (seconds).
+
+       - 8 buckets per doubling from 1 microsecond, percentiles are
+         exact to within ~9%
+       - constant memory however many samples are added
+    '''
+    BASE = 1e-6
+    STEPS = 8
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = {}
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if (value > self.max):
+            self.max = value
+
+        i = math.ceil(math.log2(value / self.BASE) * self.STEPS) if value > self.BASE else 0
+        self.buckets[i] = self.buckets.get(i, 0) + 1
+
+    def percentile(self, p):
+        '''Return upper bound of the bucket holding the p-th percentile.
+        '''
+        if (not self.count): return 0.0
+
+        rank = self.count * p / 100
+        seen = 0
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if (seen >= rank):
+                return min(self.BASE * 2 ** (i / self.STEPS), self.max)
+
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class PhaseStats(object):
+    '''Wall and CPU time spent per phase of command evaluation.
+
+       - phases: parse (bash split, flag parse), flags (flag
+         functions), command (ore_* body), capture (output of captured
+         commands to the console) and sink (-f file writes)
+       - only recorded while enabled; timing a phase costs two clock
+         reads
+       - safe to share between threads (sessions, jobs, map tasks),
+         CPU time is that of the evaluating thread
+    '''
+    PHASES = ("parse", "flags", "command", "capture", "sink")
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.__lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.__lock:
+            self.wall = OrderedDict((p, Histogram()) for p in self.PHASES)
+            self.cpu = OrderedDict((p, 0.0) for p in self.PHASES)
+
+    @staticmethod
+    def clock():
+        '''Return a mark to time a phase from.
+        '''
+        return (time.perf_counter(), time.thread_time())
+
+    def add(self, phase, mark):
+        '''Record phase as having run since mark.
+
+           - return a new mark, to time the next phase from
+        '''
+        now = (time.perf_counter(), time.thread_time())
+        with self.__lock:
+            self.wall[phase].add(now[0] - mark[0])
+            self.cpu[phase] += now[1] - mark[1]
+        return now
+
+    def summary(self):
+        '''Return dict of {phase: aggregates}, times in milliseconds.
+        '''
+        with self.__lock:
+            summary = OrderedDict()
+            for phase, h in self.wall.items():
+                summary[phase] = {"count": h.count, "total": h.total * 1000,
+                                  "cpu": self.cpu[phase] * 1000, "mean": h.mean() * 1000,
+                                  "p50": h.percentile(50) * 1000, "p95": h.percentile(95) * 1000,
+                                  "p99": h.percentile(99) * 1000, "max": h.max * 1000}
+            return summary
+
+    def table(self):
+        '''Format summary as a table.
+        '''
+        columns = ("count", "total", "cpu", "mean", "p50", "p95", "p99", "max")
+        lines = ["{:<10}".format("phase (ms)") + ''.join("{:>10}".format(c) for c in columns)]
+        for phase, s in self.summary().items():
+            lines.append("{:<10}{:>10}".format(phase, s["count"]) +
+                         ''.join("{:>10.3f}".format(s[c]) for c in columns[1:]))
+
+        return '\n'.join(lines)
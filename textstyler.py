@@ -1,3 +1,6 @@
+import re, sys, shutil, unicodedata
+from itertools import islice
+
 # USAGE: styler.BOLD + 'some text' + styler.END
 
 class Styler:
@@ -12,6 +15,7 @@ class Styler:
     UNDERLINE = '\033[4m'
     END       = '\033[0m'
     
+    # prefer visible_width() to correcting widths with these
     COLOR_LENGTH = 9 # 5 + 4 = len(COLOR) + len(END)
     STYLE_LENGTH = 8 # 4 + 4 = len(BOLD, UNDERLINE) + len(END)
 
@@ -29,3 +33,299 @@ class Styler:
             print("Error: incorrect style mode specified.")
             stylized = text
         return stylized
+
+
+# USAGE: stream.write(Cursor.UP.format(2) + 'new text' + Cursor.CLEAR_LINE)
+
+class Cursor:
+    UP           = '\033[{}A'
+    DOWN         = '\033[{}B'
+    CLEAR_LINE   = '\033[K'     # from cursor to end of line
+    CLEAR_DOWN   = '\033[J'     # from cursor to end of screen
+    CLEAR_SCREEN = '\033[2J\033[H'
+    HIDE         = '\033[?25l'
+    SHOW         = '\033[?25h'
+
+
+# ANSI escape sequences (styles, cursor movement)
+_ANSI = re.compile('\033\\[[0-9;?]*[A-Za-z]')
+
+
+def strip_styles(text):
+    '''Remove ANSI escape sequences from text.
+    '''
+    return _ANSI.sub('', text) if '\033' in text else text
+
+
+def visible_width(text):
+    '''Return number of terminal columns text takes up.
+
+       - escape sequences take none, wide (east asian) characters two
+         and combining characters none
+    '''
+    if (text.isascii()):
+        return len(strip_styles(text))
+
+    width = 0
+    for ch in strip_styles(text):
+        if (unicodedata.combining(ch)):
+            continue
+        width += 2 if unicodedata.east_asian_width(ch) in ('W', 'F') else 1
+    return width
+
+
+class TableRenderer(object):
+    '''Render an iterable of rows as aligned columns, streaming.
+
+       - column widths are measured from the header and the first
+         sample rows only, so rows are never all held in memory; wider
+         cells of later rows overflow (or are cut to max_width)
+       - widths are visible widths: styled and wide characters align
+       - columns whose sampled values are all numbers are right aligned
+       - styles: per column Styler code, or function of the cell value
+         returning one (or None)
+       - styling is only applied if output goes to a terminal (not to
+         a pipe or an Ore -f file); escape sequences in cells are
+         stripped otherwise
+       - use lines() from a streaming (generator) ore_* command to keep
+         memory flat for any number of rows
+
+       USAGE:
+           table = TableRenderer(["name", "size"], styles=[Styler.CYAN, None])
+           table.render(rows)             # print
+           yield from table.lines(rows)   # in a streaming ore_* command
+    '''
+
+    def __init__(self, columns=None, styles=None, header_style=Styler.BOLD, sample=1000,
+                 max_width=None, separator='  ', styled=None):
+        self.columns = list(columns) if columns else None
+        self.styles = styles
+        self.header_style = header_style
+        self.sample = sample
+        self.max_width = max_width
+        self.separator = separator
+        # None: style if output is a terminal
+        self.styled = styled
+
+    def render(self, rows, stream=None):
+        '''Write rendered rows to stream (sys.stdout if None).
+        '''
+        stream = stream or sys.stdout
+        styled = self.styled if self.styled is not None else stream.isatty()
+
+        write = stream.write
+        for line in self.lines(rows, styled):
+            write(line + '\n')
+
+    def lines(self, rows, styled=None):
+        '''Yield rendered lines (header first, if columns given).
+
+           - styled defaults to whether sys.stdout is a terminal when the
+             first line is produced
+        '''
+        if (styled is None):
+            styled = self.styled if self.styled is not None else sys.stdout.isatty()
+
+        rows = iter(rows)
+        # sampled rows are kept with their values, for style functions
+        values = [tuple(row) for row in islice(rows, self.sample)]
+        sample = [[self.__text(v, styled) for v in row] for row in values]
+        numeric = self.__numeric_columns(sample)
+
+        widths = self.__measure(sample)
+        if (self.columns):
+            header = [self.__text(c, styled) for c in self.columns]
+            yield self.__format(header, widths, (), styled and self.header_style)
+
+        yield from (self.__format(cells, widths, numeric, styled, row)
+                    for cells, row in zip(sample, values))
+        del sample, values
+
+        text = self.__text
+        for row in rows:
+            yield self.__format([text(v, styled) for v in row], widths, numeric, styled, row)
+
+    def __text(self, value, styled):
+        text = '' if value is None else str(value)
+        if (not styled):
+            text = strip_styles(text)
+        if (self.max_width and visible_width(text) > self.max_width):
+            text = _truncate(strip_styles(text), self.max_width)
+        return text
+
+    def __measure(self, sample):
+        widths = [visible_width(c) for c in self.columns] if self.columns else []
+        for row in sample:
+            for i, cell in enumerate(row):
+                w = visible_width(cell)
+                if (i >= len(widths)):
+                    widths.append(w)
+                elif (w > widths[i]):
+                    widths[i] = w
+        return widths
+
+    def __numeric_columns(self, sample):
+        '''Return indexes of columns with only numbers in sample.
+        '''
+        numeric = set()
+        if (not sample): return numeric
+
+        for i in range(max(len(row) for row in sample)):
+            cells = [row[i] for row in sample if i < len(row) and row[i]]
+            if (cells and all(_is_number(c) for c in cells)):
+                numeric.add(i)
+        return numeric
+
+    def __format(self, cells, widths, numeric, styled, values=None):
+        '''Pad (and style) cells into a line.
+
+           - styled is the style of the whole line for the header
+        '''
+        out = []
+        last = len(cells) - 1
+        for i, cell in enumerate(cells):
+            width = widths[i] if i < len(widths) else 0
+            pad = ' ' * (width - visible_width(cell))
+            if (i in numeric):
+                cell = pad + cell
+            elif (i < last):
+                cell = cell + pad
+
+            if (styled is True and self.styles and i < len(self.styles)):
+                style = self.styles[i]
+                if (callable(style)):
+                    style = style(values[i] if values is not None else cell)
+                if (style):
+                    cell = style + cell + Styler.END
+            out.append(cell)
+
+        line = self.separator.join(out)
+        if (isinstance(styled, str)):
+            line = styled + line + Styler.END
+        return line
+
+
+class FrameRenderer(object):
+    '''Redraw successive frames (lists of lines) in place, rewriting
+    only lines that changed since the previous frame.
+
+       - a frame identical to the previous one writes nothing
+       - changed lines are reached with cursor movement and rewritten,
+         extra lines appended, leftover lines of a longer previous frame
+         cleared
+       - lines are cut to the terminal width and frames to its height,
+         so cursor movement stays within the screen; the screen is
+         cleared and redrawn whole if the terminal was resized
+       - if stream is not a terminal (cursor False), every changed
+         frame is written whole instead
+       - cursor is left at the start of the line below the frame
+
+       USAGE:
+           frames = FrameRenderer()
+           while (...):
+               frames.draw(output.splitlines())
+    '''
+
+    def __init__(self, stream=None, cursor=None):
+        self.stream = stream or sys.stdout
+        self.cursor = self.stream.isatty() if cursor is None else cursor
+        self.frames = 0
+        self.skipped = 0
+        self.written = 0
+        self.__lines = None
+        self.__size = None
+
+    def draw(self, lines):
+        '''Draw frame, return number of characters written.
+        '''
+        lines = list(lines)
+        if (self.cursor):
+            size = shutil.get_terminal_size()
+            lines = self.__fit(lines, size)
+        else:
+            size = None
+
+        old = self.__lines
+        if (lines == old and size == self.__size):
+            self.skipped += 1
+            return 0
+
+        if (not self.cursor):
+            out = ''.join(line + '\n' for line in lines)
+        elif (old is None or size != self.__size):
+            out = ('' if old is None else Cursor.CLEAR_SCREEN) + self.__redraw([], lines)
+        else:
+            out = self.__redraw(old, lines)
+
+        self.__lines = lines
+        self.__size = size
+        self.frames += 1
+        self.written += len(out)
+
+        self.stream.write(out)
+        self.stream.flush()
+        return len(out)
+
+    def __redraw(self, old, new):
+        '''Return output turning old frame on screen into new, cursor
+        starting and ending on the line below the frame.
+        '''
+        out = []
+        row = len(old)
+
+        def move(target):
+            if (target < row):
+                out.append(Cursor.UP.format(row - target))
+            elif (target > row):
+                out.append(Cursor.DOWN.format(target - row))
+            out.append('\r')
+            return target
+
+        common = min(len(old), len(new))
+        for i in range(common):
+            if (new[i] != old[i]):
+                row = move(i)
+                out.append(new[i] + Cursor.CLEAR_LINE)
+
+        row = move(common)
+        if (len(new) > common):
+            out.extend(line + Cursor.CLEAR_LINE + '\n' for line in new[common:])
+        elif (len(old) > common):
+            out.append(Cursor.CLEAR_DOWN)
+
+        return ''.join(out)
+
+    @staticmethod
+    def __fit(lines, size):
+        # a line filling the last column would wrap, and rows scrolled
+        # off the top cannot be reached
+        width = max(size.columns - 1, 1)
+        lines = lines[:max(size.lines - 1, 1)]
+        for i, line in enumerate(lines):
+            if ('\t' in line):
+                line = lines[i] = line.expandtabs()
+            if (visible_width(line) > width):
+                lines[i] = _truncate(strip_styles(line), width)
+        return lines
+
+
+def _is_number(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+def _truncate(text, width):
+    '''Cut text to width columns, ending with an ellipsis.
+    '''
+    out = []
+    used = 0
+    for ch in text:
+        w = visible_width(ch)
+        if (used + w > width - 1):
+            break
+        out.append(ch)
+        used += w
+    return ''.join(out) + '…'